@@ -0,0 +1,389 @@
+"""
+性能測定 (ベンチマーク・負荷試験) スクリプト
+
+合成データを投入したSQLiteのDBを使い、Gemini API と Twitter API を決まった遅延で応答する偽物に差し替えて、
+各エンドポイントを並行に呼び出したときのスループットと p50 / p90 / p99 を測る。
+履歴のシリアライズなどのマイクロベンチマークも行う。乱数は --seed で固定されるため、コミット間で結果を比較できる。
+
+    python benchmark.py --records 100000 --concurrency 8 --requests 300 --output before.json
+    python benchmark.py --records 100000 --concurrency 8 --requests 300 --compare before.json
+
+DBと画像は --workdir (既定 .benchmark) に作成し、本番のDB・アップロードフォルダには触れない。
+"""
+import argparse
+import datetime
+import itertools
+import json
+import os
+import platform
+import random
+import shutil
+import subprocess
+import sys
+import threading
+import time
+import timeit
+import zlib
+from types import SimpleNamespace
+
+import numpy as np
+
+REPO_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# 合成データの本文 (組み合わせて使う)
+SAMPLE_PHRASES = (
+    '今日は友達とカフェに行って楽しかった', '仕事でミスをしてしまい落ち込んでいる', '電車が遅れてイライラした',
+    '久しぶりにゆっくり休めて幸せ', '上司の理不尽な指示に腹が立つ', '新しい本を読み始めてワクワクしている',
+    '雨で予定が流れて残念', '家族と夕飯を食べて穏やかな気分', '締め切りが近くて焦っている',
+    '散歩中にきれいな夕焼けを見た', '', '特に何もない一日だった',
+)
+
+
+# --- 偽のGemini API ---
+class FakeGeminiResponse:
+    def __init__(self, text):
+        self.text = text
+        self.usage_metadata = None
+
+
+class FakeGeminiModels:
+    """プロンプトの response_schema に合わせた決まった応答を、指定の遅延の後に返す"""
+
+    def __init__(self, latency_seconds):
+        self.latency_seconds = latency_seconds
+
+    def _respond(self, contents, config):
+        schema = config['response_schema']
+        user_input = str(contents[0]).split('\n', 1)[1]
+        if schema['type'] == 'OBJECT':
+            digest = zlib.crc32(user_input.encode('utf-8'))
+            return json.dumps({'happiness': digest % 101 / 10, 'anger': (digest >> 8) % 101 / 10})
+        if schema['items']['type'] == 'STRING':
+            return json.dumps(['深呼吸をして一息つく時間を作りましょう。', '好きなことをする時間を確保しましょう。'],
+                              ensure_ascii=False)
+        return json.dumps([
+            {'id': item['id'], 'happiness': len(item['text']) % 11, 'anger': len(item['text']) % 7}
+            for item in json.loads(user_input)
+        ])
+
+    def generate_content(self, model, contents, config):
+        time.sleep(self.latency_seconds)
+        return FakeGeminiResponse(self._respond(contents, config))
+
+    def generate_content_stream(self, model, contents, config):
+        # 遅延の半分で最初の断片、残りの半分をかけて残りの断片を返す
+        text = self._respond(contents, config)
+        chunks = [text[i:i + 16] for i in range(0, len(text), 16)]
+        time.sleep(self.latency_seconds / 2)
+        for chunk in chunks:
+            yield FakeGeminiResponse(chunk)
+            time.sleep(self.latency_seconds / 2 / len(chunks))
+
+
+class FakeGeminiClient:
+    def __init__(self, latency_seconds):
+        self.models = FakeGeminiModels(latency_seconds)
+
+
+# --- 偽のTwitter API (tweepy) ---
+class FakeTweetResponse:
+    def __init__(self, tweet_id):
+        self.headers = {'x-rate-limit-remaining': '100'}
+        self._tweet_id = tweet_id
+
+    def json(self):
+        return {'data': {'id': str(self._tweet_id)}}
+
+
+class FakeTwitterAPI:
+    def __init__(self, latency_seconds):
+        self.latency_seconds = latency_seconds
+
+    def media_upload(self, filename):
+        time.sleep(self.latency_seconds)
+        return SimpleNamespace(media_id_string='1')
+
+
+class FakeTwitterClient:
+    _ids = itertools.count(1)
+
+    def __init__(self, latency_seconds):
+        self.latency_seconds = latency_seconds
+
+    def create_tweet(self, text, media_ids=None):
+        time.sleep(self.latency_seconds)
+        return FakeTweetResponse(next(self._ids))
+
+
+# --- 準備 ---
+def load_app(args):
+    """ベンチマーク用の環境変数を設定して app を読み込む (作業フォルダに移動してから読み込む)"""
+    workdir = os.path.abspath(args.workdir)
+    db_path = os.path.join(workdir, f'benchmark_{args.records}_{args.seed}.db')
+    reuse = args.reuse_db and os.path.exists(db_path)
+    if not reuse:
+        for suffix in ('', '-wal', '-shm'):
+            if os.path.exists(db_path + suffix):
+                os.remove(db_path + suffix)
+        shutil.rmtree(os.path.join(workdir, 'uploads'), ignore_errors=True)
+    os.makedirs(workdir, exist_ok=True)
+
+    os.environ['DATABASE_URL'] = f'sqlite:///{db_path}'
+    os.environ.setdefault('GEMINI_API_KEY', 'benchmark')
+    os.environ['SCORER_MODE'] = args.scorer_mode
+    os.environ['TWITTER_DAILY_LIMIT'] = str(10 ** 9)
+    os.environ['PROFILING_ENABLED'] = 'false'
+    sys.path.insert(0, REPO_DIR)
+    os.chdir(workdir)
+    import app as app_module
+    app_module.init_app()
+
+    app_module.gateway.client = FakeGeminiClient(args.gemini_latency_ms / 1000)
+    twitter_latency = args.twitter_latency_ms / 1000
+    app_module.get_twitter_clients = lambda token, secret: (
+        FakeTwitterAPI(twitter_latency), FakeTwitterClient(twitter_latency)
+    )
+    return app_module, reuse
+
+
+def seed_records(app_module, count, seed, days):
+    """count 件の合成レコードを直近 days 日間に散らばるように投入し、集計テーブルを作り直す"""
+    rng = random.Random(seed)
+    end = datetime.datetime.now().replace(microsecond=0)
+    start = end - datetime.timedelta(days=days)
+    span = int((end - start).total_seconds())
+    # created_at 順に並ぶよう、先に時刻を並べておく
+    offsets = sorted(rng.randrange(span) for _ in range(count))
+    chunk_size = 10000
+    started = time.perf_counter()
+    with app_module.app.app_context():
+        for chunk_start in range(0, count, chunk_size):
+            rows = []
+            for offset in offsets[chunk_start:chunk_start + chunk_size]:
+                happiness = round(min(10.0, max(0.0, rng.gauss(5.5, 2.0))), 1)
+                rows.append({
+                    'text_content': f"{rng.choice(SAMPLE_PHRASES)} {rng.choice(SAMPLE_PHRASES)}".strip(),
+                    'happiness': happiness,
+                    'anger': round(min(10.0, max(0.0, rng.gauss(10.0 - happiness, 2.0) - 3.0)), 1),
+                    'image_path': f'benchmark-{chunk_start + len(rows)}.jpg' if rng.random() < 0.1 else None,
+                    'created_at': start + datetime.timedelta(seconds=offset),
+                })
+            app_module.db.session.execute(app_module.insert(app_module.EmotionRecord), rows)
+            app_module.db.session.commit()
+            print(f"  {min(chunk_start + chunk_size, count)}/{count} 件", end='\r', flush=True)
+        app_module.rebuild_rollups()
+    print(f"  {count} 件を投入しました ({time.perf_counter() - started:.1f} 秒)")
+
+
+# --- 負荷試験 ---
+def build_scenarios(app_module):
+    """(名前, リクエストを送る関数(client, 連番), テストクライアントの準備関数) のリスト。読み取りのみのものを先に並べる"""
+    today = datetime.date.today()
+    last_month = (today - datetime.timedelta(days=30)).isoformat()
+
+    def get(path, headers=None):
+        return lambda client, i: client.get(path, headers=headers)
+
+    def analyze(text, **form):
+        def send(client, i):
+            return client.post('/analyze_emotion', data={'text_content': text(i), **form})
+        return send
+
+    def login(client):
+        with client.session_transaction() as session:
+            session['access_token'] = f'benchmark-{threading.get_ident()}'
+            session['access_token_secret'] = 'benchmark'
+
+    with app_module.app.test_client() as client:
+        history_etag = client.get('/emotion_history?limit=500').headers.get('ETag')
+
+    return [
+        ('GET /emotion_history (500件)', get('/emotion_history?limit=500'), None),
+        ('GET /emotion_history (項目指定)', get('/emotion_history?limit=500&fields=created_at,happiness,anger'), None),
+        ('GET /emotion_history (304)', get('/emotion_history?limit=500', {'If-None-Match': history_etag}), None),
+        ('GET /emotion_stats (日次)', get(f'/emotion_stats?bucket=day&from={last_month}'), None),
+        ('GET /emotion_stats (時間, 全期間)', get('/emotion_stats?bucket=hour&percentiles='), None),
+        ('GET /search', get('/search?q=楽しかった&limit=20'), None),
+        ('GET /predict_emotion', get('/predict_emotion'), None),
+        ('POST /analyze_emotion (キャッシュ)', analyze(lambda i: 'ベンチマーク用の固定の文章です'), None),
+        ('POST /analyze_emotion', analyze(lambda i: f'ベンチマーク {i} 今日は楽しかった'), None),
+        ('POST /analyze_emotion (投稿あり)',
+         analyze(lambda i: f'ベンチマーク投稿 {i} 嬉しい', post_to_twitter='true'), login),
+    ]
+
+
+def percentiles_ms(latencies):
+    values = np.array(latencies) * 1000
+    p50, p90, p99 = np.percentile(values, (50, 90, 99))
+    return {'p50_ms': round(float(p50), 2), 'p90_ms': round(float(p90), 2),
+            'p99_ms': round(float(p99), 2), 'max_ms': round(float(values.max()), 2)}
+
+
+def run_load(app_module, send, setup, total, concurrency, warmup):
+    """send を total 回、concurrency 並列で呼び出してレイテンシを集計する"""
+    latencies = []
+    errors = []
+    counter = itertools.count()
+    lock = threading.Lock()
+
+    def worker():
+        client = app_module.app.test_client()
+        if setup:
+            setup(client)
+        while True:
+            i = next(counter)
+            if i >= total + warmup:
+                return
+            started = time.perf_counter()
+            response = send(client, i)
+            response.get_data()
+            elapsed = time.perf_counter() - started
+            if i < warmup:
+                continue
+            with lock:
+                latencies.append(elapsed)
+                if response.status_code >= 400:
+                    errors.append(response.status_code)
+
+    threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    wall = time.perf_counter() - started
+
+    return {'requests': len(latencies), 'errors': len(errors),
+            'throughput_rps': round(len(latencies) / wall, 1), **percentiles_ms(latencies)}
+
+
+# --- マイクロベンチマーク ---
+def best_per_call_us(func, repeat=5):
+    """func を繰り返し実行し、最速の回の1回あたりの時間 (マイクロ秒) を返す"""
+    timer = timeit.Timer(func)
+    number, _ = timer.autorange()
+    return round(min(timer.repeat(repeat=repeat, number=number)) / number * 1e6, 2)
+
+
+def run_micro_benchmarks(app_module, page_size):
+    results = {}
+    fields = list(app_module.HISTORY_FIELDS)
+    with app_module.app.app_context():
+        columns = [getattr(app_module.EmotionRecord, name) for name in app_module.HISTORY_FIELDS if name != 'thumbnails']
+        query = app_module.db.session.query(*columns).order_by(
+            app_module.EmotionRecord.created_at.asc(), app_module.EmotionRecord.id.asc()
+        ).limit(page_size)
+        rows = query.all()
+        history = [app_module.serialize_history_row(row, fields) for row in rows]
+        body = {'history': history, 'next_cursor': None, 'has_more': True}
+        cursor = app_module.encode_history_cursor(rows[-1].created_at, rows[-1].id)
+
+        results[f'履歴の取得 ({len(rows)}行)'] = best_per_call_us(lambda: query.all())
+        results[f'serialize_history_row ({len(rows)}行)'] = best_per_call_us(
+            lambda: [app_module.serialize_history_row(row, fields) for row in rows]
+        )
+        results[f'JSONエンコード ({len(rows)}行)'] = best_per_call_us(lambda: app_module.app.json.dumps(body))
+        results['encode_history_cursor'] = best_per_call_us(
+            lambda: app_module.encode_history_cursor(rows[-1].created_at, rows[-1].id)
+        )
+        results['decode_history_cursor'] = best_per_call_us(lambda: app_module.decode_history_cursor(cursor))
+        results['local_scorer.score'] = best_per_call_us(lambda: app_module.local_scorer.score(rows[0].text_content))
+    return results
+
+
+# --- 結果の表示・比較 ---
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=REPO_DIR,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def format_change(current, baseline, lower_is_better=True):
+    if not baseline:
+        return ''
+    change = (current - baseline) / baseline * 100
+    worse = change > 0 if lower_is_better else change < 0
+    return f" ({change:+.1f}%{' !' if worse and abs(change) >= 10 else ''})"
+
+
+def print_results(results, baseline=None):
+    base_routes = (baseline or {}).get('routes', {})
+    base_micro = (baseline or {}).get('micro', {})
+    if baseline:
+        print(f"\n比較対象: commit {baseline.get('commit')} ({baseline.get('started_at')})  ※ ! は10%以上の悪化")
+
+    print(f"\n{'エンドポイント':<36} {'req/s':>14} {'p50 ms':>16} {'p99 ms':>16} {'エラー':>6}")
+    for name, route in results['routes'].items():
+        base = base_routes.get(name, {})
+        print(f"{name:<36} "
+              f"{route['throughput_rps']:>7.1f}{format_change(route['throughput_rps'], base.get('throughput_rps'), False):<7} "
+              f"{route['p50_ms']:>8.2f}{format_change(route['p50_ms'], base.get('p50_ms')):<8} "
+              f"{route['p99_ms']:>8.2f}{format_change(route['p99_ms'], base.get('p99_ms')):<8} "
+              f"{route['errors']:>6}")
+
+    print(f"\n{'マイクロベンチマーク':<36} {'µs/回':>16}")
+    for name, value in results['micro'].items():
+        print(f"{name:<36} {value:>8.2f}{format_change(value, base_micro.get(name))}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='感情アーカイブの性能測定')
+    parser.add_argument('--records', type=int, default=10000, help='投入する合成レコード数 (既定 10000)')
+    parser.add_argument('--days', type=int, default=365, help='合成レコードを散らばらせる日数')
+    parser.add_argument('--seed', type=int, default=1, help='合成データの乱数シード')
+    parser.add_argument('--requests', type=int, default=200, help='エンドポイントごとのリクエスト数')
+    parser.add_argument('--warmup', type=int, default=10, help='集計から除く最初のリクエスト数')
+    parser.add_argument('--concurrency', type=int, default=8, help='同時に送るリクエスト数')
+    parser.add_argument('--gemini-latency-ms', type=float, default=300, help='偽のGemini APIの応答時間')
+    parser.add_argument('--twitter-latency-ms', type=float, default=200, help='偽のTwitter APIの応答時間')
+    parser.add_argument('--scorer-mode', default='gemini', choices=('gemini', 'local', 'prefilter'))
+    parser.add_argument('--routes', help='測定するエンドポイント名に含まれる文字列 (カンマ区切り)')
+    parser.add_argument('--skip-micro', action='store_true', help='マイクロベンチマークを行わない')
+    parser.add_argument('--workdir', default=os.path.join(REPO_DIR, '.benchmark'), help='DBと画像の作成先')
+    parser.add_argument('--reuse-db', action='store_true', help='同じ件数・シードのDBがあれば投入を省略する')
+    parser.add_argument('--output', help='結果を保存するJSONファイル')
+    parser.add_argument('--compare', help='比較する以前の結果のJSONファイル')
+    args = parser.parse_args()
+    # 作業フォルダに移動する前に、指定されたパスを絶対パスにしておく
+    args.output = os.path.abspath(args.output) if args.output else None
+
+    baseline = None
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            baseline = json.load(f)
+
+    print(f"準備中 (レコード {args.records} 件, 作業フォルダ {args.workdir})")
+    app_module, reused = load_app(args)
+    if not reused:
+        seed_records(app_module, args.records, args.seed, args.days)
+
+    results = {
+        'commit': git_commit(),
+        'started_at': datetime.datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'config': {key: value for key, value in vars(args).items() if key not in ('output', 'compare', 'workdir')},
+        'routes': {},
+        'micro': {},
+    }
+    route_filters = [name.strip() for name in args.routes.split(',')] if args.routes else None
+    for name, send, setup in build_scenarios(app_module):
+        if route_filters and not any(keyword in name for keyword in route_filters):
+            continue
+        print(f"  測定中: {name}", end='\r', flush=True)
+        results['routes'][name] = run_load(app_module, send, setup, args.requests, args.concurrency, args.warmup)
+        print(' ' * 60, end='\r')
+
+    if not args.skip_micro:
+        results['micro'] = run_micro_benchmarks(app_module, app_module.HISTORY_DEFAULT_LIMIT)
+
+    print_results(results, baseline)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+        print(f"\n結果を {args.output} に保存しました")
+
+
+if __name__ == '__main__':
+    main()
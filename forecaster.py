@@ -0,0 +1,128 @@
+"""
+日ごとの平均スコアから数日後の感情を予測する統計モデル
+
+指数平滑による水準、線形回帰による傾向 (減衰させて外挿)、曜日ごとの偏りを組み合わせる。
+ネットワークを使わず、30〜60日分の系列なら1ミリ秒未満で計算できる。
+"""
+import datetime
+
+import numpy as np
+
+SCORE_MIN = 0.0
+SCORE_MAX = 10.0
+WEEKDAY_NAMES = ('月', '火', '水', '木', '金', '土', '日')
+
+# 指数平滑の係数 (大きいほど直近の値を重視する)
+SMOOTHING_ALPHA = 0.3
+# 傾向を外挿するときの1日ごとの減衰率 (データから離れるほど傾向の影響を弱める)
+TREND_DAMPING = 0.85
+# 曜日の偏りを使うのに必要な記録日数
+SEASONALITY_MIN_DAYS = 14
+# 1日あたりの変化量がこれ未満なら「横ばい」とみなす
+FLAT_TREND_PER_DAY = 0.02
+
+
+def _smoothed_level(values):
+    """欠損 (NaN) を飛ばして指数平滑した最終的な水準を返す"""
+    observed = values[~np.isnan(values)]
+    # 重みは新しい順に alpha, alpha(1-alpha), ... 最古の値は残りの重みをまとめて持つ
+    weights = SMOOTHING_ALPHA * (1 - SMOOTHING_ALPHA) ** np.arange(observed.size)[::-1]
+    weights[0] = (1 - SMOOTHING_ALPHA) ** (observed.size - 1)
+    return float(np.dot(weights, observed))
+
+
+def _forecast_series(day_offsets, values, weekdays, target_offsets, target_weekdays):
+    """1つの系列 (幸福度または怒り) について予測値と特徴量を返す"""
+    mask = ~np.isnan(values)
+    x, y = day_offsets[mask], values[mask]
+
+    level = _smoothed_level(values)
+    slope = float(np.polyfit(x, y, 1)[0]) if x.size >= 3 and np.ptp(x) > 0 else 0.0
+
+    # 曜日ごとの平均からのずれ (記録日数が少ないうちは0に近づける)
+    weekday_effect = np.zeros(7)
+    if x.size >= SEASONALITY_MIN_DAYS:
+        residuals = y - (y.mean() + slope * (x - x.mean()))
+        sums = np.bincount(weekdays[mask], weights=residuals, minlength=7)
+        counts = np.bincount(weekdays[mask], minlength=7)
+        weekday_effect = sums / (counts + 2.0)
+
+    # 最終日からの経過日数 h に対する減衰した傾向: slope * (phi + phi^2 + ... + phi^h)
+    horizons = target_offsets - day_offsets[-1]
+    damped = TREND_DAMPING * (1 - TREND_DAMPING ** horizons) / (1 - TREND_DAMPING)
+    predictions = np.clip(level + slope * damped + weekday_effect[target_weekdays], SCORE_MIN, SCORE_MAX)
+
+    return {
+        'predicted': round(float(predictions.mean()), 1),
+        'level': round(level, 2),
+        'slope_per_day': round(slope, 3),
+        'direction': 'flat' if abs(slope) < FLAT_TREND_PER_DAY else ('up' if slope > 0 else 'down'),
+        'volatility': round(float(y.std()), 2),
+        'weekday_effect': weekday_effect,
+    }
+
+
+def forecast(days, horizon_days=3, today=None):
+    """
+    days: 日付順の {'date': 'YYYY-MM-DD', 'happiness': 平均, 'anger': 平均} のリスト (1件以上)
+    today の翌日から horizon_days 日間の平均を予測し、予測値と傾向の特徴量を返す
+    """
+    dates = [datetime.date.fromisoformat(day['date']) for day in days]
+    first = dates[0]
+    today = today or datetime.date.today()
+    start = max(today, dates[-1])
+
+    # 記録のない日をNaNで埋めた連続した日次系列にする
+    length = (dates[-1] - first).days + 1
+    happiness = np.full(length, np.nan)
+    anger = np.full(length, np.nan)
+    offsets = np.array([(d - first).days for d in dates])
+    happiness[offsets] = [day['happiness'] for day in days]
+    anger[offsets] = [day['anger'] for day in days]
+    day_offsets = np.arange(length)
+    weekdays = (first.weekday() + day_offsets) % 7
+
+    target_offsets = (start - first).days + np.arange(1, horizon_days + 1)
+    target_weekdays = (first.weekday() + target_offsets) % 7
+
+    result = {}
+    for name, values in (('happiness', happiness), ('anger', anger)):
+        result[name] = _forecast_series(day_offsets, values, weekdays, target_offsets, target_weekdays)
+
+    # 曜日の偏りは「幸福度 - 怒り」が最も高い・低い曜日として要約する
+    mood_by_weekday = result['happiness'].pop('weekday_effect') - result['anger'].pop('weekday_effect')
+    best, worst = int(np.argmax(mood_by_weekday)), int(np.argmin(mood_by_weekday))
+    has_weekly_pattern = mood_by_weekday[best] - mood_by_weekday[worst] >= 0.5
+
+    return {
+        'prediction_date': (start + datetime.timedelta(days=horizon_days)).isoformat(),
+        'predicted_happiness': result['happiness']['predicted'],
+        'predicted_anger': result['anger']['predicted'],
+        'features': {
+            'days_observed': len(days),
+            'first_date': first.isoformat(),
+            'last_date': dates[-1].isoformat(),
+            'happiness': {k: v for k, v in result['happiness'].items() if k != 'predicted'},
+            'anger': {k: v for k, v in result['anger'].items() if k != 'predicted'},
+            'best_weekday': WEEKDAY_NAMES[best] if has_weekly_pattern else None,
+            'worst_weekday': WEEKDAY_NAMES[worst] if has_weekly_pattern else None,
+        },
+    }
+
+
+def describe_trend(prediction):
+    """予測の根拠となった傾向を日本語で要約する"""
+    features = prediction['features']
+    labels = {'up': '上昇傾向', 'down': '下降傾向', 'flat': '横ばい'}
+    parts = [
+        f"直近{features['days_observed']}日分の記録では、幸福度は{labels[features['happiness']['direction']]}"
+        f"（平均的な水準 {features['happiness']['level']:.1f}）、"
+        f"怒りは{labels[features['anger']['direction']]}（平均的な水準 {features['anger']['level']:.1f}）です。"
+    ]
+    if features['best_weekday']:
+        parts.append(f"{features['best_weekday']}曜日は気分が良く、{features['worst_weekday']}曜日は気分が沈みやすい傾向があります。")
+    parts.append(
+        f"これらから、{prediction['prediction_date']}頃までの幸福度は{prediction['predicted_happiness']:.1f}、"
+        f"怒りは{prediction['predicted_anger']:.1f}程度と予測されます。"
+    )
+    return ''.join(parts)
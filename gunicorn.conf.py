@@ -0,0 +1,31 @@
+"""
+gunicorn の設定 (gunicorn -c gunicorn.conf.py wsgi:app)
+
+スキーマ移行はワーカーを起動する前にマスタープロセスで1回だけ行い、
+分析ジョブ・投稿キューの再開などプロセスごとの初期化は各ワーカーで行う。
+"""
+import multiprocessing
+import os
+
+bind = os.getenv("BIND", "127.0.0.1:5000")
+# SQLiteの書き込みは1つずつ行われるため、ワーカーは少なめにしてスレッドで並行処理する
+workers = int(os.getenv("WEB_CONCURRENCY", str(min(4, multiprocessing.cpu_count()))))
+worker_class = "gthread"
+threads = int(os.getenv("GUNICORN_THREADS", "8"))
+# Geminiの応答待ち・SSEのストリームがあるため、リクエストの処理時間に余裕を持たせる
+timeout = int(os.getenv("GUNICORN_TIMEOUT", "120"))
+graceful_timeout = 30
+keepalive = 5
+
+
+def on_starting(server):
+    from app import app, db, migrate_database
+    with app.app_context():
+        migrate_database()
+        # マスタープロセスの接続をワーカーに引き継がない
+        db.engine.dispose()
+
+
+def post_worker_init(worker):
+    from app import init_app
+    init_app()
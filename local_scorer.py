@@ -0,0 +1,157 @@
+"""
+感情スコアの採点器 (scorer)
+
+EmotionScorer を継承したクラスが text_content から幸福度・怒りを返す。
+LexiconScorer は感情語の辞書だけで採点するローカル実装で、ネットワークを使わず数ミリ秒で結果を返す。
+採点器は SCORERS に名前で登録し、create_scorer で設定の名前から作成する。
+"""
+import re
+from abc import ABC, abstractmethod
+from typing import NamedTuple
+
+import numpy as np
+
+SCORE_MIN = 0.0
+SCORE_MAX = 10.0
+
+
+class EmotionScore(NamedTuple):
+    happiness: float
+    anger: float
+    # 0.0〜1.0。低いほど判断材料が少ない・矛盾している (Geminiで採点し直す目安)
+    confidence: float
+
+
+class EmotionScorer(ABC):
+    """採点器の共通インターフェース"""
+    # SCORERS に登録する名前
+    name = None
+
+    @abstractmethod
+    def score(self, text_content):
+        """text_content の EmotionScore を返す"""
+
+    def score_many(self, texts):
+        """複数のテキストをまとめて採点する (まとめて処理できる採点器は上書きする)"""
+        return [self.score(text) for text in texts]
+
+
+# 感情語: (幸福度への寄与, 怒りへの寄与)
+# 活用しても一致するよう語幹で登録する (例: 「嬉し」は 嬉しい・嬉しかった に一致)
+EMOTION_LEXICON = {
+    # 喜び・満足
+    '嬉し': (2.5, 0.0), 'うれし': (2.5, 0.0), '楽し': (2.5, 0.0), 'たのし': (2.5, 0.0),
+    '幸せ': (3.0, 0.0), 'しあわせ': (3.0, 0.0), '幸福': (3.0, 0.0), '最高': (3.0, 0.0),
+    '良かった': (2.0, 0.0), 'よかった': (2.0, 0.0), '素敵': (2.0, 0.0), 'すてき': (2.0, 0.0),
+    '素晴らし': (2.5, 0.0), 'すばらし': (2.5, 0.0), '美味し': (2.0, 0.0), 'おいし': (2.0, 0.0),
+    '好き': (1.5, 0.0), '大好き': (2.5, 0.0), '満足': (2.0, 0.0), '達成': (2.0, 0.0),
+    '感謝': (2.0, 0.0), 'ありがと': (2.0, 0.0), '癒さ': (2.0, 0.0), '癒し': (2.0, 0.0),
+    '安心': (1.5, 0.0), '穏やか': (1.5, 0.0), 'のんびり': (1.0, 0.0), 'ほっと': (1.5, 0.0),
+    'ワクワク': (2.0, 0.0), 'わくわく': (2.0, 0.0), '楽しみ': (2.0, 0.0), '面白': (2.0, 0.0),
+    'おもしろ': (2.0, 0.0), '笑': (1.5, 0.0), '可愛': (1.5, 0.0), 'かわい': (1.5, 0.0),
+    '綺麗': (1.5, 0.0), 'きれい': (1.5, 0.0), '合格': (2.5, 0.0), '成功': (2.0, 0.0),
+    'やった': (2.0, 0.0), '頑張': (1.0, 0.0), '元気': (1.5, 0.0), '快適': (1.5, 0.0),
+    '気持ちいい': (2.0, 0.0), 'すっきり': (1.5, 0.0), 'スッキリ': (1.5, 0.0),
+    '😊': (2.0, 0.0), '😄': (2.5, 0.0), '😆': (2.5, 0.0), '🥰': (2.5, 0.0), '😍': (2.5, 0.0),
+    '🎉': (2.0, 0.0), '✨': (1.0, 0.0), '♪': (1.0, 0.0), '❤': (1.5, 0.0),
+    # 悲しみ・落ち込み
+    '悲し': (-2.5, 0.3), 'かなし': (-2.5, 0.3), '寂し': (-2.0, 0.0), 'さみし': (-2.0, 0.0),
+    '辛い': (-2.5, 0.5), 'つらい': (-2.5, 0.5), '落ち込': (-2.5, 0.3), '憂鬱': (-2.5, 0.5),
+    '不安': (-2.0, 0.3), '心配': (-1.5, 0.0), '疲れ': (-1.5, 0.5), 'つかれ': (-1.5, 0.5),
+    'しんど': (-2.0, 0.8), 'だる': (-1.5, 0.8), '眠い': (-0.5, 0.3), '泣': (-2.0, 0.3),
+    '残念': (-2.0, 0.8), '失敗': (-2.0, 0.8), '後悔': (-2.0, 0.8), '嫌い': (-2.0, 1.5),
+    '嫌': (-1.5, 1.5), '痛い': (-1.5, 0.5), '怖': (-2.0, 0.3),
+    '😢': (-2.5, 0.0), '😭': (-2.5, 0.0), '😞': (-2.0, 0.0), '😔': (-2.0, 0.0),
+    # 怒り・苛立ち
+    '怒': (-1.5, 3.5), '腹立': (-2.0, 3.5), '腹が立': (-2.0, 3.5),
+    'ムカつ': (-2.0, 4.0), 'むかつ': (-2.0, 4.0), 'ムカムカ': (-1.5, 3.0), 'イライラ': (-1.5, 3.5),
+    'いらいら': (-1.5, 3.5), 'イラッ': (-1.5, 3.0), 'イラつ': (-1.5, 3.5), 'キレ': (-1.5, 3.5),
+    '最悪': (-3.0, 2.5), 'ふざけ': (-1.5, 3.5), '許せない': (-2.0, 4.0), '理不尽': (-2.0, 3.5),
+    'うざ': (-1.5, 3.0), 'ウザ': (-1.5, 3.0), '不満': (-1.5, 2.5), '不快': (-2.0, 2.5),
+    '文句': (-1.0, 2.0), '迷惑': (-1.5, 2.5), 'ひどい': (-2.0, 2.5), '酷い': (-2.0, 2.5),
+    '失望': (-2.5, 2.0), 'がっかり': (-2.0, 1.5), '焦': (-1.0, 1.5), 'うんざり': (-2.0, 2.5),
+    '意味わからん': (-1.0, 2.5), 'なんで': (-0.3, 1.0), '😠': (-1.5, 3.5), '😡': (-2.0, 4.0),
+    '💢': (-1.5, 3.5), '🤬': (-2.0, 4.5),
+}
+
+# 直後に続くと感情語の意味を反転する否定表現 (例: 「楽しくない」「嫌じゃない」)
+NEGATION_PATTERN = re.compile(r'(?:く|で|じゃ|では)?(?:ない|なかった|なく|ません|ず)')
+# 否定を判定する範囲 (感情語の直後の文字数。「嫌ではなかった」の「ではなかった」まで含める)
+NEGATION_WINDOW = 6
+# 否定された感情語の寄与に掛ける係数 (完全な反転ではなく弱めて逆向きにする)
+NEGATION_FACTOR = -0.5
+# 「！」の連続や「めっちゃ」などの強調表現ごとに寄与を強める割合
+INTENSIFIER_PATTERN = re.compile(r'[!！]|めっちゃ|すごく|とても|本当に|ほんとに|マジで|まじで|超')
+INTENSIFIER_STEP = 0.15
+INTENSIFIER_MAX = 1.6
+# 確信度の尺度: 一致した語の寄与 (絶対値) の合計がこの値のとき確信度は約0.63になる
+# 寄与2.0以上の感情語が1つあれば、混在がない限り prefilter の既定のしきい値 (0.6) を超える
+CONFIDENCE_SCALE = 2.0
+
+
+class LexiconScorer(EmotionScorer):
+    """
+    感情語の辞書による軽量な採点器
+    テキストを辞書の語 (最長一致) に分割し、語ごとの寄与をNumPyでまとめて合計する
+    """
+    name = 'lexicon'
+
+    def __init__(self, lexicon=EMOTION_LEXICON):
+        # 長い語を先に試すことで「大好き」が「好き」より優先して一致する
+        terms = sorted(lexicon, key=len, reverse=True)
+        self._term_index = {term: i for i, term in enumerate(terms)}
+        self._pattern = re.compile('|'.join(re.escape(term) for term in terms))
+        # 語ごとの寄与: shape (語数, 2) 列は [幸福度, 怒り]
+        self._weights = np.array([lexicon[term] for term in terms], dtype=np.float64)
+
+    def tokenize(self, text_content):
+        """感情語の出現を (語の番号, 否定の有無) の配列で返す"""
+        ids = []
+        negated = []
+        for match in self._pattern.finditer(text_content):
+            term = match.group()
+            ids.append(self._term_index[term])
+            # 「許せない」のように否定込みで登録された語は否定判定しない
+            following = text_content[match.end():match.end() + NEGATION_WINDOW]
+            negated.append(not term.endswith(('ない', 'ず')) and NEGATION_PATTERN.match(following) is not None)
+        return np.array(ids, dtype=np.intp), np.array(negated, dtype=bool)
+
+    def score(self, text_content):
+        text_content = text_content or ''
+        ids, negated = self.tokenize(text_content)
+        if ids.size == 0:
+            # 手がかりがない場合は中立の値を低い確信度で返す
+            return EmotionScore(5.0, 0.0, 0.0)
+
+        contributions = self._weights[ids] * np.where(negated, NEGATION_FACTOR, 1.0)[:, None]
+        intensity = min(INTENSIFIER_MAX, 1.0 + INTENSIFIER_STEP * len(INTENSIFIER_PATTERN.findall(text_content)))
+        happiness_total, anger_total = contributions.sum(axis=0) * intensity
+
+        # 幸福度は中立の5を中心に、怒りは0から、寄与の合計に応じて飽和させる
+        happiness = 5.0 + 5.0 * np.tanh(happiness_total / 4.0)
+        anger = SCORE_MAX * (1.0 - np.exp(-max(anger_total, 0.0) / 4.0))
+
+        # 一致した語の寄与が大きいほど確信度を上げ、喜びと怒り・悲しみが混在する場合は大きく下げる
+        # (語の数ではなく寄与で測るため、はっきりした感情語1つの短い投稿はローカル採点で済む)
+        positive = contributions[:, 0].clip(min=0).sum()
+        negative = (-contributions[:, 0]).clip(min=0).sum() + contributions[:, 1].clip(min=0).sum()
+        mixed = min(positive, negative) / max(positive, negative, 1e-9)
+        confidence = (1.0 - np.exp(-(positive + negative) / CONFIDENCE_SCALE)) * (1.0 - mixed) ** 2
+
+        return EmotionScore(
+            round(float(np.clip(happiness, SCORE_MIN, SCORE_MAX)), 1),
+            round(float(np.clip(anger, SCORE_MIN, SCORE_MAX)), 1),
+            round(float(confidence), 2),
+        )
+
+
+# 設定 (LOCAL_SCORER) で選べる採点器
+SCORERS = {scorer.name: scorer for scorer in (LexiconScorer,)}
+
+
+def create_scorer(name):
+    """名前に対応する採点器を作成する。未登録の名前は ValueError"""
+    try:
+        return SCORERS[name]()
+    except KeyError:
+        raise ValueError(f"LOCAL_SCORER は {', '.join(SCORERS)} のいずれかを指定してください。") from None
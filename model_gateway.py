@@ -0,0 +1,340 @@
+"""
+Gemini API の呼び出しをまとめるゲートウェイ
+
+プロンプトは版付きのテンプレートとして保持し、長い指示は system_instruction、出力形式は response_schema で渡す。
+呼び出しごとの期限 (deadline)、同時実行数の上限、ジッター付きの再試行、サーキットブレーカーを備え、
+テンプレートごとの呼び出し回数・レイテンシ・トークン数を記録する。
+"""
+import random
+import threading
+import time
+from typing import NamedTuple
+
+import httpx
+from google.genai import errors
+
+
+class PromptTemplate(NamedTuple):
+    name: str
+    # 内容を変更したら上げる (分析結果・予測結果のキャッシュのキーに含まれる)
+    version: str
+    system_instruction: str
+    # str.format で埋め込むユーザー入力部分
+    user_template: str
+    response_schema: dict
+
+
+ANALYSIS_PROMPT = PromptTemplate(
+    name='analysis',
+    version='2',
+    system_instruction=(
+        "あなたは、人間の感情を深く理解する心理分析の専門家です。\n"
+        "提供されたテキストと画像を総合的に分析し、書き手の「幸福度（happiness）」と「怒り（anger）」のレベルを0.0から10.0の範囲（浮動小数点数）で正確に評価してください。\n"
+        "\n"
+        "【重要】分析の指針:\n"
+        "1.  **感情の定義:**\n"
+        "    * **幸福度 (happiness):** 表面的な喜びだけでなく、満足感、達成感、安らぎ、感謝、穏やかな気持ち、ワクワクする期待感も「幸福度」として評価してください。\n"
+        "    * **怒り (anger):** 激しい憤りだけでなく、イライラ、不満、失望、焦燥感、不快感、理不尽さへの抵抗も「怒り」として評価してください。\n"
+        "2.  **総合的なコンテキスト分析:**\n"
+        "    * テキストと画像の両方が存在する場合、それらの**関連性**を最重要視してください。\n"
+        "    * **[補完]:** 画像がテキストの意味を強めている場合（例: テキスト「最高の一日」＋画像「笑顔」）は、スコアを強めてください。\n"
+        "    * **[矛盾・皮肉]:** テキストと画像が矛盾する場合（例: テキスト「もう最悪」＋画像「満面の笑み」）は、皮肉（サーカズム）や強がりの可能性を考慮し、隠された本心を推測してください。この場合、テキストの内容をやや優先しつつも、画像の表情が示す複雑さをスコアに反映させてください。\n"
+        "    * **[背景の考慮]:** 画像に写る背景、物、状況（例: 散らかった部屋、美しい風景、食事）も、書き手の感情状態を示す重要な手がかりとして分析に含めてください。\n"
+        "3.  **ニュアンスの読解:**\n"
+        "    * テキストの表面的な単語だけでなく、文脈全体から**暗黙的な感情（implicit meaning）**を読み取ってください。\n"
+        "    * 画像が提供されていない場合、またはテキストが提供されていない場合は、提供された片方の情報のみから最大限深く分析してください。\n"
+        "\n"
+        "--- 出力形式 ---\n"
+        "* スコアは必ず小数点第一位までの数値（float）にしてください。\n"
+    ),
+    user_template="--- 入力情報 ---\nテキスト: {text_content}",
+    response_schema={
+        "type": "OBJECT",
+        "properties": {
+            "happiness": {"type": "NUMBER"},
+            "anger": {"type": "NUMBER"},
+        },
+        "required": ["happiness", "anger"],
+    },
+)
+
+BATCH_ANALYSIS_PROMPT = PromptTemplate(
+    name='batch_analysis',
+    version='2',
+    system_instruction=(
+        "あなたは、人間の感情を深く理解する心理分析の専門家です。\n"
+        "入力のJSON配列の各要素は、日記などに書かれた1件のテキストです。\n"
+        "それぞれについて、書き手の「幸福度（happiness）」と「怒り（anger）」のレベルを0.0から10.0の範囲（浮動小数点数）で評価してください。\n"
+        "\n"
+        "【重要】分析の指針:\n"
+        "* **幸福度 (happiness):** 満足感、達成感、安らぎ、感謝、穏やかな気持ち、ワクワクする期待感も含めて評価してください。\n"
+        "* **怒り (anger):** イライラ、不満、失望、焦燥感、不快感、理不尽さへの抵抗も含めて評価してください。\n"
+        "* テキストの表面的な単語だけでなく、文脈全体から暗黙的な感情を読み取ってください。\n"
+        "* 各要素は独立に評価し、他の要素の内容に影響されないでください。\n"
+        "\n"
+        "--- 出力形式 ---\n"
+        "* 入力の各要素につき1件、入力と同じ id を持つ {id, happiness, anger} を配列で出力してください。\n"
+        "* スコアは必ず小数点第一位までの数値（float）にしてください。\n"
+    ),
+    user_template="--- 入力情報 ---\n{payload}",
+    response_schema={
+        "type": "ARRAY",
+        "items": {
+            "type": "OBJECT",
+            "properties": {
+                "id": {"type": "STRING"},
+                "happiness": {"type": "NUMBER"},
+                "anger": {"type": "NUMBER"},
+            },
+            "required": ["id", "happiness", "anger"],
+        },
+    },
+)
+
+PREDICTION_ADVICE_PROMPT = PromptTemplate(
+    name='prediction_advice',
+    version='2',
+    system_instruction=(
+        "あなたは、人間の感情パターンに詳しい心理カウンセラーです。\n"
+        "入力は、ユーザーの過去の感情記録から統計的に算出した「感情の天気予報」と、その根拠となった傾向の特徴量です。\n"
+        "予測結果に基づき、ユーザーがより良い感情状態で過ごすための、**具体的で実行可能（actionable）**なアドバイスを**2〜3個**提案してください。\n"
+        "（例: 「怒りが高まりそうなので、深呼吸する時間を作ってください」「幸福度が高い傾向なので、新しいことに挑戦してみましょう」など）\n"
+        "\n"
+        "--- 特徴量の説明 ---\n"
+        "* level: 直近を重視した平均的な水準 (0.0〜10.0)\n"
+        "* slope_per_day / direction: 1日あたりの変化量と傾向 (up: 上昇, down: 下降, flat: 横ばい)\n"
+        "* volatility: 日ごとのばらつき (大きいほど感情の起伏が大きい)\n"
+        "* best_weekday / worst_weekday: 気分が良い・沈みやすい曜日 (傾向がない場合は null)\n"
+        "\n"
+        "--- 出力形式 ---\n"
+        "* アドバイスの文字列の配列をJSONで出力してください。\n"
+    ),
+    user_template="--- 予測結果 ---\n{payload}",
+    response_schema={"type": "ARRAY", "items": {"type": "STRING"}},
+)
+
+PROMPTS = {prompt.name: prompt for prompt in (ANALYSIS_PROMPT, BATCH_ANALYSIS_PROMPT, PREDICTION_ADVICE_PROMPT)}
+
+
+class ModelUnavailable(Exception):
+    """サーキットブレーカーが開いている、または期限内に実行枠を確保できなかった"""
+
+
+def is_retryable(error):
+    """一時的なエラー (タイムアウト・接続エラー・429・5xx) かどうか"""
+    if isinstance(error, httpx.TransportError):
+        return True
+    if isinstance(error, errors.ServerError):
+        return True
+    return isinstance(error, errors.ClientError) and error.code == 429
+
+
+class CircuitBreaker:
+    """
+    連続して failure_threshold 回失敗すると reset_seconds の間は呼び出しを止める (open)
+    経過後は1回だけ試行を許し (half-open)、成功すれば元に戻す
+    """
+
+    def __init__(self, failure_threshold, reset_seconds):
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self._failures = 0
+        self._opened_at = None
+        self._trial_running = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        with self._lock:
+            if self._opened_at is None:
+                return 'closed'
+            return 'half_open' if time.monotonic() - self._opened_at >= self.reset_seconds else 'open'
+
+    def allow(self):
+        with self._lock:
+            if self._opened_at is None:
+                return True
+            if time.monotonic() - self._opened_at < self.reset_seconds or self._trial_running:
+                return False
+            self._trial_running = True
+            return True
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._trial_running = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            self._trial_running = False
+            if self._opened_at is not None or self._failures >= self.failure_threshold:
+                self._opened_at = time.monotonic()
+
+
+class ModelGateway:
+    """Gemini API の呼び出し口 (スレッドセーフ)"""
+
+    def __init__(self, client_factory, model, timeout_seconds=30.0, max_concurrency=8, max_retries=2,
+                 retry_base_seconds=1.0, breaker_threshold=5, breaker_reset_seconds=30.0):
+        # クライアントは最初の呼び出しで作成する (fork 前のプロセスで接続を作らないため)
+        self._client_factory = client_factory
+        self._client = None
+        self._client_lock = threading.Lock()
+        self.model = model
+        self.timeout_seconds = timeout_seconds
+        self.max_retries = max_retries
+        self.retry_base_seconds = retry_base_seconds
+        self.breaker = CircuitBreaker(breaker_threshold, breaker_reset_seconds)
+        self._slots = threading.BoundedSemaphore(max_concurrency)
+        self._stats = {}
+        self._stats_lock = threading.Lock()
+
+    @property
+    def client(self):
+        if self._client is None:
+            with self._client_lock:
+                if self._client is None:
+                    self._client = self._client_factory()
+        return self._client
+
+    @client.setter
+    def client(self, client):
+        self._client = client
+
+    def prompt_version(self, name):
+        return PROMPTS[name].version
+
+    def _config(self, prompt, timeout):
+        return {
+            "system_instruction": prompt.system_instruction,
+            "response_mime_type": "application/json",
+            "response_schema": prompt.response_schema,
+            "http_options": {"timeout": max(1, int(timeout * 1000))},
+        }
+
+    def _record(self, name, started, response=None, error=None, retries=0):
+        usage = getattr(response, 'usage_metadata', None)
+        with self._stats_lock:
+            stats = self._stats.setdefault(name, {
+                'calls': 0, 'errors': 0, 'retries': 0, 'latency_seconds_sum': 0.0, 'latency_seconds_max': 0.0,
+                'prompt_tokens': 0, 'output_tokens': 0,
+            })
+            latency = time.monotonic() - started
+            stats['calls'] += 1
+            stats['errors'] += error is not None
+            stats['retries'] += retries
+            stats['latency_seconds_sum'] += latency
+            stats['latency_seconds_max'] = max(stats['latency_seconds_max'], latency)
+            if usage is not None:
+                stats['prompt_tokens'] += usage.prompt_token_count or 0
+                stats['output_tokens'] += usage.candidates_token_count or 0
+
+    def stats(self):
+        """テンプレートごとの呼び出し統計とサーキットブレーカーの状態"""
+        with self._stats_lock:
+            calls = {name: dict(stats) for name, stats in self._stats.items()}
+        return {'model': self.model, 'circuit': self.breaker.state, 'prompts': calls}
+
+    def _attempt_timeout(self, name, deadline, timeout_seconds):
+        """次の試行のタイムアウト (秒) を返す。期限切れ・ブレーカーが開いている場合は例外を送出する"""
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            raise TimeoutError(f"{name}: 期限内に応答がありませんでした。")
+        if not self.breaker.allow():
+            raise ModelUnavailable(f"{name}: Gemini APIへの呼び出しを一時停止しています。")
+        return min(timeout_seconds, remaining)
+
+    def _backoff(self, name, error, attempt, max_retries, deadline):
+        """失敗を記録し、再試行できる場合は待機する。再試行できない場合は error を送出する"""
+        if not is_retryable(error):
+            # 入力の誤りなど (400系) はAPI自体は応答しているのでブレーカーの失敗に数えない
+            self.breaker.record_success()
+            raise error
+        self.breaker.record_failure()
+        if attempt >= max_retries:
+            raise error
+        wait = self.retry_base_seconds * (2 ** attempt) * random.uniform(0.5, 1.5)
+        if time.monotonic() + wait >= deadline:
+            raise error
+        print(f"Gemini API呼び出しエラー ({name}, 再試行 {attempt + 1}/{max_retries}, {wait:.1f}秒後): {error}")
+        time.sleep(wait)
+
+    def _acquire(self, name, deadline):
+        if not self._slots.acquire(timeout=max(0.0, deadline - time.monotonic())):
+            raise ModelUnavailable(f"{name}: 同時実行数の上限に達しています。")
+
+    def generate(self, name, parts=(), timeout_seconds=None, deadline_seconds=None, max_retries=None, **params):
+        """
+        テンプレート name で1回の応答を生成して返す
+        parts はユーザー入力の後に追加する内容 (画像など)、params は user_template に埋め込む値
+        timeout_seconds は1回の試行、deadline_seconds は再試行を含む全体の上限 (省略時は timeout_seconds と同じ)
+        """
+        prompt = PROMPTS[name]
+        contents = [prompt.user_template.format(**params), *parts]
+        timeout_seconds = timeout_seconds or self.timeout_seconds
+        started = time.monotonic()
+        deadline = started + (deadline_seconds or timeout_seconds)
+        max_retries = self.max_retries if max_retries is None else max_retries
+
+        self._acquire(name, deadline)
+        try:
+            for attempt in range(max_retries + 1):
+                timeout = self._attempt_timeout(name, deadline, timeout_seconds)
+                try:
+                    response = self.client.models.generate_content(
+                        model=self.model, contents=contents, config=self._config(prompt, timeout)
+                    )
+                except Exception as e:
+                    self._backoff(name, e, attempt, max_retries, deadline)
+                    continue
+                self.breaker.record_success()
+                self._record(name, started, response=response, retries=attempt)
+                return response
+        except Exception as e:
+            self._record(name, started, error=e, retries=attempt)
+            raise
+        finally:
+            self._slots.release()
+
+    def generate_stream(self, name, parts=(), timeout_seconds=None, deadline_seconds=None, max_retries=None, **params):
+        """
+        テンプレート name で応答を生成し、届いた断片のテキストを順に返すジェネレータ
+        再試行は最初の断片が届く前の失敗に限る (途中まで返した内容を重複させないため)
+        """
+        prompt = PROMPTS[name]
+        contents = [prompt.user_template.format(**params), *parts]
+        timeout_seconds = timeout_seconds or self.timeout_seconds
+        started = time.monotonic()
+        deadline = started + (deadline_seconds or timeout_seconds)
+        max_retries = self.max_retries if max_retries is None else max_retries
+
+        self._acquire(name, deadline)
+        try:
+            for attempt in range(max_retries + 1):
+                received = False
+                last_chunk = None
+                timeout = self._attempt_timeout(name, deadline, timeout_seconds)
+                try:
+                    for chunk in self.client.models.generate_content_stream(
+                        model=self.model, contents=contents, config=self._config(prompt, timeout)
+                    ):
+                        received = True
+                        last_chunk = chunk
+                        yield chunk.text or ''
+                except Exception as e:
+                    if received:
+                        self.breaker.record_failure()
+                        raise
+                    self._backoff(name, e, attempt, max_retries, deadline)
+                    continue
+                self.breaker.record_success()
+                # トークン数は最後の断片の usage_metadata に入る
+                self._record(name, started, response=last_chunk, retries=attempt)
+                return
+        except Exception as e:
+            self._record(name, started, error=e, retries=attempt)
+            raise
+        finally:
+            self._slots.release()
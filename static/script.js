@@ -1,6 +1,23 @@
 const API_HISTORY_URL = '/emotion_history'; // 履歴取得API
 const API_ANALYZE_URL = '/analyze_emotion'; // 分析・記録API
 const API_PREDICT_URL = '/predict_emotion'; // 感情予測API 
+// 履歴APIの1ページあたりの件数
+const HISTORY_PAGE_SIZE = 1000;
+// グラフ描画に必要な項目のみ (履歴APIの fields 射影)
+const CHART_FIELDS = 'created_at,happiness,anger';
+const API_STATS_URL = '/emotion_stats'; // 集計API
+// この件数を超えたらグラフは生データではなくサーバー側の集計値を描画する
+const CHART_RAW_POINT_LIMIT = 300;
+// 分析の進捗 (SSEの stage イベント) ごとに表示するメッセージ
+const ANALYSIS_STAGE_MESSAGES = {
+    saved: '入力を受け付けました。感情を分析中です...',
+    scoring: '感情を分析しています...',
+    stored: '記録を保存しました。',
+    tweet_queued: 'Twitterへの投稿を予約しました。',
+};
+// 予約したTwitter投稿の状態を確認する間隔 (ミリ秒) と最大回数
+const TWITTER_STATUS_POLL_INTERVAL_MS = 3000;
+const TWITTER_STATUS_POLL_MAX = 20;
 
 const emotionForm = document.getElementById('emotionForm');     
 const submitButton = document.getElementById('submitButton');     
@@ -31,7 +48,7 @@ let composing = false;
 let emotionChartInstance = null; 
 //twitter投稿回数制限
 let remainingCount = 10;
-let  = true;
+let canPostToTwitter = true;
 
 textarea.addEventListener('compositionstart', () => composing = true);
 textarea.addEventListener('compositionend', () => { composing = false; limit(); });
@@ -140,18 +157,60 @@ function displayImagePreview(files) {
     }
 }
 
+// 取得済みの履歴を fields ごとに保持し、2回目以降は差分 (since=) のみ取得する
+// 再採点・アーカイブ・過去の記録の取り込みでサーバーの revision が変わった場合は全件を取得し直す
+const historyCache = {};
+
 /**
  * 感情データをバックエンドAPIから取得する関数
+ * @param {string|null} fields 取得する項目 (カンマ区切り、null の場合は全項目)
  * @returns {Promise<Array>} 感情レコードの配列
  */
-async function fetchEmotionData() {
+async function fetchEmotionData(fields = null) {
+    const cacheKey = fields || '*';
+    let cache = historyCache[cacheKey] || { records: [], lastId: null, revision: null };
+
     try {
-        const response = await fetch(API_HISTORY_URL);
-        if (!response.ok) {
-            throw new Error('感情履歴の取得に失敗しました。');
+        let newRecords = [];
+        let cursor = null;
+        let hasMore = true;
+
+        // next_cursor をたどって全ページを取得
+        while (hasMore) {
+            const params = new URLSearchParams({ limit: HISTORY_PAGE_SIZE });
+            if (fields) params.set('fields', fields);
+            if (cache.lastId !== null) params.set('since', cache.lastId);
+            if (cursor) params.set('cursor', cursor);
+
+            const response = await fetch(`${API_HISTORY_URL}?${params}`);
+            if (!response.ok) {
+                throw new Error('感情履歴の取得に失敗しました。');
+            }
+            const data = await response.json();
+
+            if (data.revision !== cache.revision) {
+                // 取得済みの行 (または取得途中のページ) が古くなっているため、キャッシュを捨てて最初から取得する
+                const stale = cache.lastId !== null || cursor !== null;
+                cache = { records: [], lastId: null, revision: data.revision };
+                if (stale) {
+                    newRecords = [];
+                    cursor = null;
+                    hasMore = true;
+                    continue;
+                }
+            }
+
+            newRecords.push(...(data.history || []));
+            cursor = data.next_cursor;
+            hasMore = data.has_more;
         }
-        const data = await response.json();
-        return data.history || [];
+
+        cache.records = cache.records.concat(newRecords);
+        if (newRecords.length > 0) {
+            cache.lastId = newRecords.reduce((maxId, record) => Math.max(maxId, record.id), cache.lastId || 0);
+        }
+        historyCache[cacheKey] = cache;
+        return [...cache.records];
     } catch (error) {
         console.error("データ取得エラー:", error);
         showMessage('error', `感情履歴の取得中にエラーが発生しました: ${error.message}`);
@@ -159,6 +218,48 @@ async function fetchEmotionData() {
     }
 }
 
+/**
+ * 時間バケットごとの集計値を取得する関数
+ * @param {string} bucket 'hour' | 'day' | 'week'
+ * @returns {Promise<Array>} バケットごとの集計値の配列
+ */
+async function fetchEmotionStats(bucket) {
+    try {
+        // グラフは平均値のみ使うため、percentiles を空にして集計テーブルから取得する
+        const response = await fetch(`${API_STATS_URL}?bucket=${bucket}&percentiles=`);
+        if (!response.ok) {
+            throw new Error('感情の集計値の取得に失敗しました。');
+        }
+        const data = await response.json();
+        return data.stats || [];
+    } catch (error) {
+        console.error("集計取得エラー:", error);
+        showMessage('error', `感情の集計値の取得中にエラーが発生しました: ${error.message}`);
+        return [];
+    }
+}
+
+/**
+ * グラフ用のデータを取得する関数
+ * 件数が少なければ生データ、多ければ日次 (さらに多ければ週次) の平均値を返す
+ * @returns {Promise<Array>} created_at, happiness, anger を持つ配列
+ */
+async function fetchChartData() {
+    const dailyStats = await fetchEmotionStats('day');
+    const total = dailyStats.reduce((sum, stat) => sum + stat.count, 0);
+
+    if (total <= CHART_RAW_POINT_LIMIT) {
+        return fetchEmotionData(CHART_FIELDS);
+    }
+
+    const stats = dailyStats.length > CHART_RAW_POINT_LIMIT ? await fetchEmotionStats('week') : dailyStats;
+    return stats.map(stat => ({
+        created_at: stat.bucket_start,
+        happiness: stat.happiness.mean,
+        anger: stat.anger.mean
+    }));
+}
+
 /**
  * 感情履歴を元に折れ線グラフを描画する関数
  * @param {Array} records 感情レコードの配列
@@ -257,6 +358,53 @@ function drawEmotionChart(records) {
 }
 
 
+// --- SSE (Server-Sent Events) の受信 ---
+/**
+ * レスポンスがSSEのストリームかどうか
+ * @param {Response} response
+ */
+function isEventStream(response) {
+    return (response.headers.get('Content-Type') || '').startsWith('text/event-stream');
+}
+
+/**
+ * SSEのレスポンスを読み、イベントが届くたびに onEvent(イベント名, データ) を呼ぶ関数
+ * @param {Response} response fetch のレスポンス
+ * @param {Function} onEvent イベントごとのコールバック (例外を投げると読み込みを中断する)
+ */
+async function readEventStream(response, onEvent) {
+    const reader = response.body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = '';
+
+    try {
+        while (true) {
+            const { done, value } = await reader.read();
+            if (done) break;
+            buffer += decoder.decode(value, { stream: true });
+
+            // イベントは空行で区切られる
+            let boundary;
+            while ((boundary = buffer.indexOf('\n\n')) >= 0) {
+                const block = buffer.slice(0, boundary);
+                buffer = buffer.slice(boundary + 2);
+
+                let event = 'message';
+                const dataLines = [];
+                for (const line of block.split('\n')) {
+                    if (line.startsWith('event:')) event = line.slice(6).trim();
+                    else if (line.startsWith('data:')) dataLines.push(line.slice(5).trim());
+                }
+                if (dataLines.length > 0) {
+                    onEvent(event, JSON.parse(dataLines.join('\n')));
+                }
+            }
+        }
+    } finally {
+        reader.releaseLock();
+    }
+}
+
 // --- 感情予測処理 ---
 async function fetchEmotionPrediction() {
     // 予測メッセージとローディングスピナーの表示
@@ -267,16 +415,34 @@ async function fetchEmotionPrediction() {
     `;
 
     try {
-        const response = await fetch(API_PREDICT_URL);
-        const result = await response.json();
+        // 予測値はすぐに、アドバイスは生成された分から順に表示する
+        const response = await fetch(`${API_PREDICT_URL}?stream=true`);
 
-        if (response.ok && result.status === 'success') {
-            displayPredictionResult(result.prediction);
-        } else {
+        if (!isEventStream(response)) {
             // API側でエラーが返された場合（例：データ不足）
+            const result = await response.json();
             throw new Error(result.error || '予測の取得に失敗しました。');
         }
 
+        const advice = [];
+        let completed = false;
+        await readEventStream(response, (event, data) => {
+            if (event === 'forecast') {
+                displayPredictionResult({ ...data, advice: [] }, true);
+            } else if (event === 'advice' || event === 'advice_partial') {
+                advice[data.index] = data.text;
+                renderAdviceList(advice, true);
+            } else if (event === 'done') {
+                completed = true;
+                displayPredictionResult(data.prediction);
+            } else if (event === 'error') {
+                throw new Error(data.error);
+            }
+        });
+        if (!completed) {
+            throw new Error('予測の受信が途中で終了しました。');
+        }
+
     } catch (error) {
         console.error("感情予測エラー:", error);
         predictionResultDiv.innerHTML = `
@@ -289,11 +455,10 @@ async function fetchEmotionPrediction() {
 
 /**
  * 予測結果をHTMLで整形して表示する関数
- * @param {object} prediction - Geminiから返された予測データ
+ * @param {object} prediction - サーバーから返された予測データ
+ * @param {boolean} adviceLoading - アドバイスを受信中かどうか
  */
-function displayPredictionResult(prediction) {
-    const adviceHtml = prediction.advice.map(adv => `<li>${adv}</li>`).join('');
-
+function displayPredictionResult(prediction, adviceLoading = false) {
     predictionResultDiv.innerHTML = `
         <div class="prediction-box">
             <h3 class="prediction-title">感情の天気予報（${prediction.prediction_date}頃の予測）</h3>
@@ -306,12 +471,23 @@ function displayPredictionResult(prediction) {
 
             <div class="advice-section">
                 <h4>日々の意思決定に役立つアドバイス 💡</h4>
-                <ul>
-                    ${adviceHtml}
-                </ul>
+                <ul></ul>
             </div>
         </div>
     `;
+    renderAdviceList(prediction.advice, adviceLoading);
+}
+
+/**
+ * 予測結果のアドバイス一覧を描画する関数 (受信中は末尾にスピナーを表示する)
+ * @param {Array<string>} advice アドバイスの配列
+ * @param {boolean} loading 受信中かどうか
+ */
+function renderAdviceList(advice, loading) {
+    const list = predictionResultDiv.querySelector('.advice-section ul');
+    if (!list) return;
+    const loadingHtml = loading ? '<li><span class="spinner"></span> アドバイスを作成中...</li>' : '';
+    list.innerHTML = advice.filter(adv => adv).map(adv => `<li>${adv}</li>`).join('') + loadingHtml;
 }
 
 /**
@@ -342,7 +518,10 @@ function displayHistoryList(records) {
             <p class="history-text">${record.text_content}</p>
             ${record.image_path ? `
                 <div class="history-item-image-container">
-                    <img src="${record.image_path}" alt="添付画像" class="history-image">
+                    <a href="${record.image_path}" target="_blank" rel="noopener">
+                        <img src="${record.thumbnails['320']}" srcset="${record.thumbnails['320']} 1x, ${record.thumbnails['640']} 2x"
+                             alt="添付画像" class="history-image" loading="lazy">
+                    </a>
                 </div>
             ` : ''}
         `;
@@ -350,6 +529,59 @@ function displayHistoryList(records) {
     });
 }
 
+/**
+ * 分析のSSEを読み、進捗をメッセージエリアに表示して分析結果を返す関数
+ * @param {Response} response /analyze_emotion (stream=true) のレスポンス
+ * @returns {Promise<object>} 分析結果 (同期モードのレスポンスと同じ形式)
+ */
+async function readAnalysisStream(response) {
+    let result = null;
+    await readEventStream(response, (event, data) => {
+        if (event === 'stage') {
+            const message = data.stage === 'scored'
+                ? `分析が完了しました（幸福度: ${data.happiness.toFixed(1)}, 怒り: ${data.anger.toFixed(1)}）。記録を保存しています...`
+                : ANALYSIS_STAGE_MESSAGES[data.stage];
+            if (message) showMessage('info', message);
+        } else if (event === 'result') {
+            result = data;
+        } else if (event === 'error') {
+            throw new Error(data.error);
+        }
+    });
+    if (!result) {
+        throw new Error('分析結果を受信できませんでした。');
+    }
+    return result;
+}
+
+/**
+ * 予約したTwitter投稿の結果を確認し、投稿済み・失敗になったら通知する関数
+ * @param {string} statusUrl 投稿状態API (/records/<id>/twitter) のURL
+ */
+async function watchTwitterPost(statusUrl) {
+    for (let i = 0; i < TWITTER_STATUS_POLL_MAX; i++) {
+        await new Promise(resolve => setTimeout(resolve, TWITTER_STATUS_POLL_INTERVAL_MS));
+        try {
+            const response = await fetch(statusUrl);
+            if (!response.ok) return;
+            const post = await response.json();
+            if (post.status === 'posted') {
+                showMessage('success', 'Twitterに投稿されました。');
+                return;
+            }
+            if (post.status === 'failed') {
+                showMessage('error', `Twitterへの投稿に失敗しました: ${post.error || '不明なエラー'}`);
+                // 予約した投稿回数は返却されるため、連携状態を再取得する
+                checkTwitterAuthStatus();
+                return;
+            }
+        } catch (error) {
+            console.error("Twitter投稿状態の確認エラー:", error);
+            return;
+        }
+    }
+}
+
 // --- フォーム送信処理 ---
 emotionForm.addEventListener('submit', async (e) => {
     e.preventDefault();
@@ -373,6 +605,8 @@ emotionForm.addEventListener('submit', async (e) => {
         formData.append('file', file);
     }
     formData.append('post_to_twitter', shouldPostToTwitter);
+    // 分析の進捗をSSEで受け取りながら待つ
+    formData.append('stream', 'true');
 
     try {
         const response = await fetch(API_ANALYZE_URL, {
@@ -380,7 +614,8 @@ emotionForm.addEventListener('submit', async (e) => {
             body: formData,
         });
 
-        const result = await response.json();
+        // 入力エラーや回数上限の場合はSSEではなくJSONで返る
+        const result = isEventStream(response) ? await readAnalysisStream(response) : await response.json();
 
         if (response.ok && result.status === 'success') {
        
@@ -393,12 +628,14 @@ emotionForm.addEventListener('submit', async (e) => {
             }
 
             // メッセージを生成
-            const twitterMsg = result.twitter_posted ? 'Twitterにも投稿されました。' : (shouldPostToTwitter ? 'Twitter連携はONでしたが投稿に失敗しました。' : 'Twitterへの投稿はスキップされました。');
+            // Twitter投稿はサーバーの送信キューで行われるため、予約できたかどうかを表示する
+            const twitterMsg = result.twitter_status ? 'Twitterへの投稿を予約しました。' : (shouldPostToTwitter ? 'Twitter連携はONでしたが投稿に失敗しました。' : 'Twitterへの投稿はスキップされました。');
             
             let successMessage = `感情の記録が完了しました！ 幸福度: ${result.happiness.toFixed(1)}, 怒り: ${result.anger.toFixed(1)} ${twitterMsg}`;
             
-            if (shouldPostToTwitter && result.twitter_posted) {
+            if (shouldPostToTwitter && result.twitter_status) {
                  successMessage += ` (残りTwitter投稿可能回数: ${remainingCount}回)`;
+                 watchTwitterPost(result.twitter_status_url);
             }
             
             showMessage('success', successMessage);
@@ -425,7 +662,7 @@ emotionForm.addEventListener('submit', async (e) => {
             displayImagePreview(null);
             limit();
             // グラフと予測を更新するため、分析タブを再初期化
-            const records = await fetchEmotionData();
+            const records = await fetchChartData();
             drawEmotionChart(records);
             fetchEmotionPrediction(); 
 
@@ -557,8 +794,8 @@ fileInput.addEventListener('change', (e) => {
 
 // アプリケーション起動時のメイン処理
 async function initApp() {
-    // 1. 感情データを取得
-    const records = await fetchEmotionData();
+    // 1. 感情データを取得 (件数が多い場合は集計値)
+    const records = await fetchChartData();
     
     // データがあればグラフを描画
     if (records && records.length > 0) {
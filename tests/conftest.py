@@ -0,0 +1,145 @@
+"""
+テスト共通の設定
+
+app は import 時に環境変数から設定を読むため、一時ディレクトリのSQLiteを指す DATABASE_URL を設定してから import する。
+Gemini API は ModelGateway のクライアントファクトリから偽のクライアントを渡して置き換え、
+分析ジョブと投稿キューはスレッドを使わずにテストの中で順に実行する。
+"""
+import json
+import os
+import sys
+import tempfile
+from types import SimpleNamespace
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+WORKDIR = tempfile.mkdtemp(prefix='emotion-archive-test-')
+os.environ.update({
+    'DATABASE_URL': 'sqlite:///' + os.path.join(WORKDIR, 'test.db'),
+    'GEMINI_API_KEY': 'test',
+    'SECRET_KEY': 'test-secret-key',
+    'SCORER_MODE': 'gemini',
+    'LOCAL_SCORER_FALLBACK': 'false',
+    'TWITTER_DAILY_LIMIT': '3',
+})
+# アップロードフォルダ (相対パス) を一時ディレクトリに作る
+os.chdir(WORKDIR)
+sys.path.insert(0, ROOT)
+
+import app as app_module  # noqa: E402
+from model_gateway import ModelGateway, PROMPTS  # noqa: E402
+
+
+# --- 偽のGemini API ---
+class FakeResponse:
+    def __init__(self, text):
+        self.text = text
+        self.usage_metadata = None
+
+
+class FakeModels:
+    """
+    client.models の代わり。system_instruction からテンプレートを判別して決まった応答を返す
+    errors に例外を入れておくと、次の呼び出しから順に送出する
+    """
+
+    def __init__(self):
+        self.calls = []
+        self.errors = []
+        self.scores = (7.0, 2.0)
+
+    def generate_content(self, model, contents, config):
+        name = next(name for name, prompt in PROMPTS.items()
+                    if prompt.system_instruction == config['system_instruction'])
+        self.calls.append(name)
+        if self.errors:
+            raise self.errors.pop(0)
+        happiness, anger = self.scores
+        if name == 'batch_analysis':
+            items = json.loads(contents[0].split('\n', 1)[1])
+            return FakeResponse(json.dumps([
+                {'id': item['id'], 'happiness': happiness, 'anger': anger} for item in items
+            ]))
+        if name == 'prediction_advice':
+            return FakeResponse(json.dumps(['ゆっくり休みましょう。']))
+        return FakeResponse(json.dumps({'happiness': happiness, 'anger': anger}))
+
+    def generate_content_stream(self, model, contents, config):
+        """generate_content と同じ応答を数文字ずつの断片に分けて返す"""
+        text = self.generate_content(model, contents, config).text
+        for start in range(0, len(text), 5):
+            yield FakeResponse(text[start:start + 5])
+
+
+class JobQueue:
+    """get_job_executor の代わり。投入されたジョブを記録し、run_all で順に実行する"""
+
+    def __init__(self):
+        self.submitted = []
+
+    def submit(self, fn, *args):
+        self.submitted.append((fn, args))
+
+    def run_all(self):
+        while self.submitted:
+            fn, args = self.submitted.pop(0)
+            fn(*args)
+
+
+@pytest.fixture
+def app(monkeypatch):
+    """空のDBと、プロセス内のキャッシュを消した状態のアプリ"""
+    app_module.init_app()
+    with app_module.app.app_context():
+        db = app_module.db
+        for table in reversed(db.metadata.sorted_tables):
+            statement = table.delete()
+            if table is app_module.AppMetadata.__table__:
+                statement = statement.where(table.c.key != 'schema_version')
+            db.session.execute(statement)
+        db.session.commit()
+
+    app_module._analysis_memory_cache.clear()
+    app_module._pending_cache_touches.clear()
+    app_module._quota_views.clear()
+    app_module._twitter_rate_limited_until.clear()
+    app_module._twitter_clients.clear()
+    monkeypatch.setattr(app_module, '_prediction_memory_cache', None)
+    # 投稿キューはテストから process_twitter_outbox で送る
+    monkeypatch.setattr(app_module, 'wake_twitter_sender', lambda: None)
+    return app_module.app
+
+
+@pytest.fixture
+def gemini(monkeypatch):
+    """偽のクライアントをファクトリから渡した ModelGateway に置き換え、その client.models を返す"""
+    models = FakeModels()
+    client = SimpleNamespace(models=models)
+    gateway = ModelGateway(lambda: client, app_module.MODEL_NAME, timeout_seconds=5,
+                           max_retries=0, retry_base_seconds=0.0)
+    monkeypatch.setattr(app_module, 'gateway', gateway)
+    return models
+
+
+@pytest.fixture
+def jobs(monkeypatch):
+    queue = JobQueue()
+    monkeypatch.setattr(app_module, 'get_job_executor', lambda: queue)
+    return queue
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+@pytest.fixture
+def linked_client(app):
+    """Twitterと連携済みのセッションを持つテストクライアント"""
+    test_client = app.test_client()
+    with test_client.session_transaction() as session:
+        session['access_token'] = '42-access'
+        session['access_token_secret'] = 'access-secret'
+        session['screen_name'] = 'tester'
+    return test_client
@@ -0,0 +1,99 @@
+import datetime
+import io
+import os
+
+from PIL import Image
+
+import app as app_module
+from app import AnalysisCache, EmotionRecord, db
+
+
+def png_file():
+    buffer = io.BytesIO()
+    Image.new('RGB', (8, 8), (0, 200, 0)).save(buffer, 'PNG')
+    buffer.seek(0)
+    return buffer, 'photo.png'
+
+
+def analyze(client, text, **form):
+    return client.post('/analyze_emotion', data={'text_content': text, **form}).get_json()
+
+
+def test_repeated_input_is_served_from_cache(app, gemini, client):
+    first = analyze(client, '楽しかった')
+    second = analyze(client, '楽しかった')
+    bypassed = analyze(client, '楽しかった', no_cache='true')
+
+    assert (first['cached'], second['cached'], bypassed['cached']) == (False, True, False)
+    assert second['happiness'] == first['happiness']
+    assert gemini.calls == ['analysis', 'analysis']
+    with app.app_context():
+        # キャッシュから返した場合も記録は追加する
+        assert EmotionRecord.query.count() == 3
+
+
+def test_cached_image_is_not_decoded(app, gemini, client, monkeypatch):
+    analyze(client, '写真', file=png_file())
+    decoded = []
+    for name in ('create_thumbnails', 'load_image_for_model'):
+        original = getattr(app_module, name)
+        monkeypatch.setattr(app_module, name, lambda *args, name=name, original=original: (
+            decoded.append(name), original(*args))[1])
+
+    body = analyze(client, '写真', file=png_file())
+
+    assert body['cached'] is True
+    assert decoded == []
+    # サムネイルは最初に表示されたときに作成する
+    with app.app_context():
+        filename = db.session.get(EmotionRecord, body['record_id']).image_path
+    size = app_module.THUMBNAIL_SIZES[0]
+    assert not os.path.exists(app_module.thumbnail_file_path(filename, size))
+    client.get(f'/images/thumbs/{size}/{filename}.{app_module.THUMBNAIL_EXT}')
+    assert decoded == ['create_thumbnails']
+    assert os.path.exists(app_module.thumbnail_file_path(filename, size))
+
+
+def test_expired_entries_are_misses(app, gemini, client):
+    analyze(client, '楽しかった')
+    app_module._analysis_memory_cache.clear()
+    with app.app_context():
+        expired = datetime.datetime.now() - datetime.timedelta(hours=app_module.ANALYSIS_CACHE_TTL_HOURS + 1)
+        AnalysisCache.query.update({'created_at': expired})
+        db.session.commit()
+
+    assert analyze(client, '楽しかった')['cached'] is False
+    assert len(gemini.calls) == 2
+
+
+def test_trim_keeps_recently_used_entries(app, monkeypatch):
+    monkeypatch.setattr(app_module, 'ANALYSIS_CACHE_MAX_ENTRIES', 2)
+    with app.app_context():
+        for key in ('old', 'hot'):
+            app_module.store_cached_analysis(key, 5.0, 1.0)
+            db.session.commit()
+        # hot はメモリから返され、DBの最終利用日時はまだ古いまま
+        assert app_module.get_cached_analysis('hot') == (5.0, 1.0)
+        assert app_module._pending_cache_touches
+
+        app_module.store_cached_analysis('new', 5.0, 1.0)
+        db.session.commit()
+
+        assert {row.key for row in AnalysisCache.query} == {'hot', 'new'}
+        assert db.session.get(AnalysisCache, 'hot').hit_count == 1
+
+
+def test_flushed_touches_survive_a_rollback(app):
+    with app.app_context():
+        app_module.store_cached_analysis('key', 5.0, 1.0)
+        db.session.commit()
+        app_module.get_cached_analysis('key')
+
+        app_module.flush_cache_touches(force=True)
+        db.session.rollback()
+        assert app_module._pending_cache_touches['key'][1] == 1
+
+        app_module.flush_cache_touches(force=True)
+        db.session.commit()
+        assert app_module._pending_cache_touches == {}
+        assert db.session.get(AnalysisCache, 'key').hit_count == 1
@@ -0,0 +1,129 @@
+import datetime
+
+import pytest
+from sqlalchemy import update
+
+import app as app_module
+from app import AnalysisJob, EmotionRecord, TwitterOutbox, TwitterQuota, db
+
+
+def quota_remaining(account='42'):
+    quota = db.session.get(TwitterQuota, account)
+    return quota.remaining_uses if quota else app_module.TWITTER_DAILY_LIMIT
+
+
+def submit_async(linked_client, text):
+    response = linked_client.post('/analyze_emotion', data={
+        'text_content': text, 'async': 'true', 'post_to_twitter': 'true',
+    })
+    assert response.status_code == 202
+    return response.get_json()['job_id']
+
+
+def test_async_job_completes_and_queues_tweet(app, gemini, jobs, linked_client):
+    job_id = submit_async(linked_client, '楽しかった')
+    with app.app_context():
+        job = db.session.get(AnalysisJob, job_id)
+        assert job.status == 'pending'
+        # トークンは暗号化して保存される
+        assert job.twitter_access_token not in (None, '42-access')
+        assert quota_remaining() == app_module.TWITTER_DAILY_LIMIT - 1
+
+    jobs.run_all()
+
+    body = linked_client.get(f'/jobs/{job_id}').get_json()
+    assert body['status'] == 'done'
+    assert body['result']['happiness'] == 7.0
+    assert body['result']['twitter_status'] == 'pending'
+    with app.app_context():
+        job = db.session.get(AnalysisJob, job_id)
+        assert job.twitter_access_token is None and job.twitter_access_token_secret is None
+        assert EmotionRecord.query.count() == 1
+        outbox = TwitterOutbox.query.one()
+        assert app_module.decrypt_twitter_tokens(outbox.access_token, outbox.access_token_secret) == (
+            '42-access', 'access-secret')
+
+
+def test_failed_job_refunds_quota_and_clears_tokens(app, gemini, jobs, linked_client):
+    gemini.errors.append(RuntimeError('model down'))
+    job_id = submit_async(linked_client, '楽しかった')
+
+    jobs.run_all()
+
+    body = linked_client.get(f'/jobs/{job_id}').get_json()
+    assert body['status'] == 'failed'
+    assert body['error']
+    with app.app_context():
+        job = db.session.get(AnalysisJob, job_id)
+        assert job.twitter_access_token is None and job.twitter_access_token_secret is None
+        assert quota_remaining() == app_module.TWITTER_DAILY_LIMIT
+        assert EmotionRecord.query.count() == 0
+        assert TwitterOutbox.query.count() == 0
+
+
+def test_job_is_processed_once(app, gemini, jobs, client):
+    job_id = client.post('/analyze_emotion', data={'text_content': 'a', 'async': 'true'}).get_json()['job_id']
+
+    # 同じジョブが2回投入されても、pending から取得できた1回だけ処理される
+    app_module.run_analysis_job(job_id)
+    app_module.run_analysis_job(job_id)
+
+    assert gemini.calls == ['analysis']
+    with app.app_context():
+        assert EmotionRecord.query.count() == 1
+
+
+def test_stale_running_jobs_are_resumed(app, gemini, jobs):
+    now = datetime.datetime.now()
+    stale = now - datetime.timedelta(minutes=app_module.ANALYSIS_JOB_STALE_MINUTES + 1)
+    with app.app_context():
+        db.session.add_all([
+            AnalysisJob(id='pending', status='pending', text_content='a', created_at=now),
+            AnalysisJob(id='stale', status='running', text_content='b', created_at=stale, started_at=stale),
+            AnalysisJob(id='recent', status='running', text_content='c', created_at=now, started_at=now),
+            AnalysisJob(id='done', status='done', text_content='d', created_at=stale, finished_at=stale),
+        ])
+        db.session.commit()
+
+        assert app_module.resume_pending_jobs() == 2
+
+    jobs.run_all()
+    with app.app_context():
+        statuses = {job.id: job.status for job in AnalysisJob.query}
+    assert statuses == {'pending': 'done', 'stale': 'done', 'recent': 'running', 'done': 'done'}
+
+
+
+@pytest.mark.parametrize('gemini_fails', [False, True])
+def test_job_reclaimed_while_running_is_finished_once(app, gemini, jobs, linked_client, monkeypatch, gemini_fails):
+    job_id = submit_async(linked_client, '楽しかった')
+    answer = gemini.generate_content
+
+    def reclaim_then_answer(*args, **kwargs):
+        # 処理中に別のワーカーの起動で中断扱いになり、ジョブが再投入された
+        with db.engine.begin() as connection:
+            connection.execute(update(AnalysisJob.__table__)
+                               .where(AnalysisJob.__table__.c.id == job_id).values(status='pending'))
+        if gemini_fails:
+            raise RuntimeError('model down')
+        return answer(*args, **kwargs)
+
+    monkeypatch.setattr(gemini, 'generate_content', reclaim_then_answer)
+    jobs.run_all()
+
+    # 最初のワーカーの結果は破棄され、投稿回数の返却も行わない
+    with app.app_context():
+        job = db.session.get(AnalysisJob, job_id)
+        assert job.status == 'pending'
+        assert job.twitter_access_token is not None
+        assert EmotionRecord.query.count() == 0
+        assert quota_remaining() == app_module.TWITTER_DAILY_LIMIT - 1
+
+    monkeypatch.setattr(gemini, 'generate_content', answer)
+    app_module.run_analysis_job(job_id)
+
+    with app.app_context():
+        assert db.session.get(AnalysisJob, job_id).status == 'done'
+        assert EmotionRecord.query.count() == 1
+        assert TwitterOutbox.query.count() == 1
+        assert quota_remaining() == app_module.TWITTER_DAILY_LIMIT - 1
@@ -0,0 +1,108 @@
+import base64
+import datetime
+import gzip
+import io
+import json
+import os
+import uuid
+
+from PIL import Image
+
+import app as app_module
+from app import EmotionRecord, EmotionRollup, db
+
+
+def png_bytes():
+    buffer = io.BytesIO()
+    Image.new('RGB', (8, 8), (255, 0, 0)).save(buffer, 'PNG')
+    return buffer.getvalue()
+
+
+def archive_file(items):
+    lines = [json.dumps({'format': app_module.ARCHIVE_FORMAT, 'version': 1, 'images': True})]
+    lines += [json.dumps(item, ensure_ascii=False) for item in items]
+    return io.BytesIO(gzip.compress('\n'.join(lines).encode('utf-8')))
+
+
+def import_items(client, items):
+    return client.post('/import_archive', data={'file': (archive_file(items), 'archive.ndjson.gz')})
+
+
+def archive_item(record_id, image_path=None, image_data=None):
+    item = {'id': record_id, 'text_content': f'記録{record_id}', 'happiness': 6.0, 'anger': 2.0,
+            'image_path': image_path, 'created_at': '2025-01-01T12:00:00'}
+    if image_data is not None:
+        item['image_data'] = base64.b64encode(image_data).decode('ascii')
+    return item
+
+
+def upload_path(filename):
+    return os.path.join(app_module.app.config['UPLOAD_FOLDER'], filename)
+
+
+def test_export_and_import_round_trip(app, client):
+    filename = f'{uuid.uuid4()}.png'
+    with open(upload_path(filename), 'wb') as f:
+        f.write(png_bytes())
+    with app.app_context():
+        db.session.add_all([
+            EmotionRecord(id=1, text_content='a', happiness=8.0, anger=1.0, image_path=filename,
+                          created_at=datetime.datetime(2025, 1, 1, 9)),
+            EmotionRecord(id=2, text_content='b', happiness=2.0, anger=6.0,
+                          created_at=datetime.datetime(2025, 1, 2, 9)),
+        ])
+        db.session.commit()
+
+    exported = client.get('/export').data
+    with app.app_context():
+        EmotionRecord.query.delete()
+        db.session.commit()
+    app_module.remove_uploaded_image(filename)
+
+    response = client.post('/import_archive', data={'file': (io.BytesIO(exported), 'archive.ndjson.gz')})
+
+    assert response.get_json()['imported'] == 2
+    assert os.path.exists(upload_path(filename))
+    assert os.path.exists(app_module.thumbnail_file_path(filename, app_module.THUMBNAIL_SIZES[0]))
+    with app.app_context():
+        rows = [(r.id, r.text_content, r.image_path) for r in EmotionRecord.query.order_by(EmotionRecord.id)]
+    assert rows == [(1, 'a', filename), (2, 'b', None)]
+
+    # 同じアーカイブを再度取り込んでも重複しない
+    response = client.post('/import_archive', data={'file': (io.BytesIO(exported), 'archive.ndjson.gz')})
+    assert response.get_json() == {'status': 'success', 'imported': 0, 'skipped': 2}
+
+
+def test_import_rejects_files_that_are_not_uploaded_images(app, client):
+    script = b'<script>alert(1)</script>'
+    mismatched = f'{uuid.uuid4()}.jpg'
+    response = import_items(client, [
+        archive_item(1, 'evil.html', script),
+        archive_item(2, f'{uuid.uuid4()}.png', script),
+        archive_item(3, mismatched, png_bytes()),
+    ])
+
+    assert response.get_json()['imported'] == 3
+    assert not os.path.exists(upload_path('evil.html'))
+    assert client.get('/images/evil.html').status_code == 404
+    assert not os.path.exists(upload_path(mismatched))
+    with app.app_context():
+        assert [r.image_path for r in EmotionRecord.query] == [None, None, None]
+
+
+def test_archive_old_records_keeps_rollups(app, client):
+    old = datetime.datetime.now() - datetime.timedelta(days=40)
+    with app.app_context():
+        for created_at in (old, datetime.datetime.now()):
+            record = EmotionRecord(text_content='a', happiness=5.0, anger=1.0, created_at=created_at)
+            db.session.add(record)
+            app_module.add_record_to_rollups(record)
+        db.session.commit()
+        rollups_before = EmotionRollup.query.count()
+
+        result = app_module.archive_old_records(30)
+
+        assert result['archived'] == 1
+        assert os.path.exists(result['path'])
+        assert EmotionRecord.query.count() == 1
+        assert EmotionRollup.query.count() == rollups_before
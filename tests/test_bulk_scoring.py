@@ -0,0 +1,37 @@
+import datetime
+import io
+import json
+
+import app as app_module
+from app import AnalysisJob, EmotionRecord, db
+
+
+def test_bulk_import_runs_as_job(app, gemini, jobs, client):
+    lines = '\n'.join(json.dumps({'text_content': text}, ensure_ascii=False) for text in ('a', 'b', 'c'))
+    response = client.post('/bulk_import', data={'file': (io.BytesIO(lines.encode('utf-8')), 'a.jsonl')})
+    assert response.status_code == 202
+
+    jobs.run_all()
+
+    body = client.get(response.get_json()['job_url']).get_json()
+    assert body['status'] == 'done'
+    assert body['result']['imported'] == 3
+    with app.app_context():
+        assert EmotionRecord.query.count() == 3
+        assert db.session.get(AnalysisJob, body['job_id']).payload is None
+
+
+def test_reclaimed_bulk_import_is_not_applied_twice(app, gemini):
+    claimed_at = datetime.datetime(2025, 1, 1)
+    with app.app_context():
+        db.session.add(AnalysisJob(id='bulk', status='running', kind='bulk_import', text_content='',
+                                   payload='{"text_content": "a"}', started_at=claimed_at))
+        db.session.commit()
+        # 中断扱いで再投入され、別のワーカーが取得し直した
+        AnalysisJob.query.filter_by(id='bulk').update({'started_at': datetime.datetime.now()})
+        db.session.commit()
+
+        app_module.run_bulk_import_job(db.session.get(AnalysisJob, 'bulk'), claimed_at)
+
+        assert EmotionRecord.query.count() == 0
+        assert db.session.get(AnalysisJob, 'bulk').status == 'running'
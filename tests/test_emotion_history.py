@@ -0,0 +1,86 @@
+import datetime
+
+from sqlalchemy import insert
+
+import app as app_module
+from app import EmotionRecord, db
+
+
+def add_records(app, count, created_at=None):
+    created_at = created_at or datetime.datetime(2025, 1, 1, 12)
+    with app.app_context():
+        db.session.execute(insert(EmotionRecord), [
+            {'text_content': f't{i}', 'happiness': 5.0, 'anger': 1.0, 'created_at': created_at}
+            for i in range(count)
+        ])
+        db.session.commit()
+
+
+def test_keyset_pages_cover_every_record_once(app, client):
+    # created_at が同じレコードでも (created_at, id) のキーセットで漏れ・重複なく辿れる
+    add_records(app, 23)
+
+    ids, cursor = [], None
+    while True:
+        response = client.get('/emotion_history', query_string={'limit': 5, **({'cursor': cursor} if cursor else {})})
+        body = response.get_json()
+        ids += [item['id'] for item in body['history']]
+        cursor = body['next_cursor']
+        if not body['has_more']:
+            break
+
+    assert len(ids) == 23
+    assert ids == sorted(set(ids))
+
+
+def test_fields_projection(app, client):
+    add_records(app, 1)
+
+    item = client.get('/emotion_history?fields=happiness').get_json()['history'][0]
+
+    assert set(item) == {'id', 'happiness'}
+
+
+def test_invalid_parameters_return_400(app, client):
+    assert client.get('/emotion_history?fields=bogus').status_code == 400
+    assert client.get('/emotion_history?cursor=invalid').status_code == 400
+    assert client.get('/emotion_history?limit=0').status_code == 400
+
+
+def test_etag_returns_304_until_history_changes(app, client):
+    add_records(app, 3)
+    etag = client.get('/emotion_history').headers['ETag']
+
+    assert client.get('/emotion_history', headers={'If-None-Match': etag}).status_code == 304
+
+    add_records(app, 1)
+    response = client.get('/emotion_history', headers={'If-None-Match': etag})
+    assert response.status_code == 200
+    assert response.headers['ETag'] != etag
+
+
+def history_revision(client, **params):
+    return client.get('/emotion_history', query_string=params).get_json()['revision']
+
+
+def test_revision_changes_when_existing_history_changes(app, gemini, client):
+    add_records(app, 2)
+    revision = history_revision(client)
+    assert history_revision(client, since=2) == revision
+
+    # 差分 (since=) では見えない書き換えのたびに revision が変わる
+    with app.app_context():
+        app_module.rescore_records()
+    rescored = history_revision(client, since=2)
+    assert rescored != revision
+
+    with app.app_context():
+        app_module.add_import_rows([{'text_content': 'old', 'happiness': 5.0, 'anger': 1.0, 'image_path': None,
+                                     'created_at': datetime.datetime(2024, 1, 1)}])
+        db.session.commit()
+    imported = history_revision(client, since=3)
+    assert imported != rescored
+
+    with app.app_context():
+        app_module.archive_old_records(days=30)
+    assert history_revision(client) != imported
@@ -0,0 +1,58 @@
+import datetime
+
+import pytest
+from sqlalchemy import insert
+
+from app import EmotionRecord, db
+
+PERCENTILES = (1, 7, 14, 28, 50, 55, 56, 90, 100)
+
+
+@pytest.fixture
+def records(app):
+    """2日分の記録 (100件と7件)。値は日ごとに並びを崩して入れる"""
+    rows = []
+    for day, count in ((1, 100), (2, 7)):
+        for i in range(count):
+            rows.append({
+                'text_content': f'{day}-{i}',
+                'happiness': (i * 37 % count) / 10,
+                'anger': (i * 53 % count) / 10,
+                'created_at': datetime.datetime(2025, 1, day, i % 24),
+            })
+    with app.app_context():
+        db.session.execute(insert(EmotionRecord), rows)
+        db.session.commit()
+    return rows
+
+
+def nearest_rank(values, p):
+    """最近順位法のパーセンタイル (順位 ceil(n * p / 100) を整数で求める)"""
+    values = sorted(values)
+    return values[-(-len(values) * p // 100) - 1]
+
+
+def test_percentiles_match_nearest_rank(app, client, records):
+    response = client.get('/emotion_stats', query_string={
+        'bucket': 'day', 'percentiles': ','.join(map(str, PERCENTILES)),
+    })
+    assert response.status_code == 200
+    stats = response.get_json()['stats']
+
+    assert [item['count'] for item in stats] == [100, 7]
+    for item, day in zip(stats, (1, 2)):
+        rows = [row for row in records if row['created_at'].day == day]
+        for metric in ('happiness', 'anger'):
+            values = [row[metric] for row in rows]
+            # n * p / 100 がちょうど整数になる順位 (p7, p14, p28, p55, p56 など) も1つずれない
+            for p in PERCENTILES:
+                assert item[metric][f'p{p}'] == nearest_rank(values, p), (day, metric, p)
+            assert item[metric]['min'] == min(values)
+            assert item[metric]['max'] == max(values)
+            assert item[metric]['mean'] == round(sum(values) / len(values), 2)
+
+
+def test_invalid_percentiles_return_400(app, client):
+    for value in ('0', '101', 'median'):
+        assert client.get('/emotion_stats', query_string={'percentiles': value}).status_code == 400
+    assert client.get('/emotion_stats?bucket=month').status_code == 400
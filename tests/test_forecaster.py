@@ -0,0 +1,84 @@
+import datetime
+
+import pytest
+
+import app as app_module
+from app import EmotionRecord, PredictionCache, db
+from forecaster import SCORE_MAX, describe_trend, forecast
+
+TODAY = datetime.date(2025, 3, 1)
+
+
+def daily(values, start=datetime.date(2025, 1, 1)):
+    return [{'date': (start + datetime.timedelta(days=i)).isoformat(), 'happiness': h, 'anger': a}
+            for i, (h, a) in enumerate(values)]
+
+
+def test_trend_is_extrapolated_and_clipped():
+    days = daily([(min(10.0, 5.0 + i * 0.5), max(0.0, 5.0 - i * 0.5)) for i in range(20)])
+
+    prediction = forecast(days, horizon_days=3, today=datetime.date(2025, 1, 20))
+
+    assert prediction['prediction_date'] == '2025-01-23'
+    assert prediction['features']['happiness']['direction'] == 'up'
+    assert prediction['features']['anger']['direction'] == 'down'
+    assert 0.0 <= prediction['predicted_anger'] <= prediction['predicted_happiness'] <= SCORE_MAX
+
+
+def test_weekday_pattern_and_missing_days():
+    # 月曜日 (2025-01-06) だけ気分が沈む4週分の記録。週末の記録は欠けている
+    values = [(2.0, 6.0) if i % 7 == 0 else (7.0, 1.0) for i in range(28)]
+    days = [day for day in daily(values, start=datetime.date(2025, 1, 6))
+            if datetime.date.fromisoformat(day['date']).weekday() < 5]
+
+    prediction = forecast(days, today=TODAY)
+
+    assert prediction['features']['days_observed'] == 20
+    assert prediction['features']['worst_weekday'] == '月'
+    assert '月曜日は気分が沈みやすい' in describe_trend(prediction)
+
+
+def test_single_day_is_enough():
+    prediction = forecast(daily([(6.0, 2.0)]), today=TODAY)
+
+    assert (prediction['predicted_happiness'], prediction['predicted_anger']) == (6.0, 2.0)
+    assert prediction['features']['happiness']['direction'] == 'flat'
+
+
+@pytest.fixture
+def records(app):
+    with app.app_context():
+        for days_ago in range(10):
+            record = EmotionRecord(text_content='a', happiness=4.0 + days_ago * 0.3, anger=2.0,
+                                   created_at=datetime.datetime.now() - datetime.timedelta(days=days_ago))
+            db.session.add(record)
+            app_module.add_record_to_rollups(record)
+        db.session.commit()
+
+
+def test_prediction_uses_local_forecast_and_gemini_advice(app, gemini, client, records):
+    body = client.get('/predict_emotion').get_json()
+
+    prediction = body['prediction']
+    # 予測値は統計モデルで求め、Geminiにはアドバイスだけを書かせる
+    assert gemini.calls == ['prediction_advice']
+    assert prediction['advice'] == ['ゆっくり休みましょう。']
+    assert prediction['features']['happiness']['direction'] == 'down'
+    assert prediction['tendency_summary'].startswith('直近10日分の記録では')
+
+
+def test_advice_failure_falls_back_without_caching(app, gemini, client, records):
+    gemini.errors.append(RuntimeError('model down'))
+
+    body = client.get('/predict_emotion').get_json()
+
+    assert body['status'] == 'success'
+    assert body['prediction']['advice']
+    assert 'ゆっくり休みましょう。' not in body['prediction']['advice']
+    with app.app_context():
+        assert PredictionCache.query.count() == 0
+
+
+def test_prediction_without_records_returns_400(app, gemini, client):
+    assert client.get('/predict_emotion').status_code == 400
+    assert gemini.calls == []
@@ -0,0 +1,85 @@
+import io
+import os
+
+from PIL import Image
+
+import app as app_module
+from app import EmotionRecord, db
+
+
+def image_file(size=(8, 8), fmt='PNG'):
+    buffer = io.BytesIO()
+    Image.new('RGB', size, (255, 128, 0)).save(buffer, fmt)
+    buffer.seek(0)
+    return buffer
+
+
+def uploaded_files():
+    """アップロードフォルダとサムネイルフォルダにあるファイル"""
+    names = set()
+    for root, _, files in os.walk(app_module.app.config['UPLOAD_FOLDER']):
+        names.update(os.path.join(root, name) for name in files)
+    return names
+
+
+def analyze(client, file):
+    return client.post('/analyze_emotion', data={'text_content': '写真', 'file': (file, 'photo.png')})
+
+
+def test_upload_creates_thumbnails(app, gemini, client):
+    response = analyze(client, image_file((2000, 1000)))
+
+    assert response.status_code == 200
+    with app.app_context():
+        filename = db.session.get(EmotionRecord, response.get_json()['record_id']).image_path
+    for size in app_module.THUMBNAIL_SIZES:
+        with Image.open(app_module.thumbnail_file_path(filename, size)) as thumbnail:
+            assert thumbnail.size == (size, size // 2)
+
+
+def test_large_image_is_downscaled_for_the_model(app, tmp_path):
+    path = tmp_path / 'large.jpg'
+    path.write_bytes(image_file((4000, 3000), 'JPEG').getvalue())
+
+    img = app_module.load_image_for_model(str(path))
+
+    assert max(img.size) == app_module.IMAGE_MAX_EDGE
+    assert img.size[0] / img.size[1] == 4000 / 3000
+
+
+def test_unsupported_file_is_rejected(app, gemini, client):
+    before = uploaded_files()
+
+    response = analyze(client, io.BytesIO(b'<svg xmlns="http://www.w3.org/2000/svg"/>'))
+
+    assert response.status_code == 400
+    assert uploaded_files() == before
+    assert gemini.calls == []
+
+
+def test_broken_image_is_removed(app, gemini, client):
+    before = uploaded_files()
+    # 先頭バイトは PNG だが、画像としては読めないファイル
+    broken = io.BytesIO(image_file().getvalue()[:40])
+
+    response = analyze(client, broken)
+
+    assert response.status_code == 400
+    assert uploaded_files() == before
+    assert gemini.calls == []
+
+
+def test_image_load_failure_removes_upload_and_thumbnails(app, gemini, client, monkeypatch):
+    before = uploaded_files()
+
+    def failing_load(path):
+        raise OSError('truncated')
+
+    monkeypatch.setattr(app_module, 'load_image_for_model', failing_load)
+
+    response = analyze(client, image_file())
+
+    assert response.status_code >= 400
+    assert uploaded_files() == before
+    with app.app_context():
+        assert EmotionRecord.query.count() == 0
@@ -0,0 +1,72 @@
+import pytest
+
+import app as app_module
+from local_scorer import EmotionScorer, LexiconScorer, create_scorer
+
+
+@pytest.fixture
+def scorer():
+    return LexiconScorer()
+
+
+def test_clear_emotions_score_with_high_confidence(scorer):
+    happy = scorer.score('今日は本当に楽しかった！')
+    angry = scorer.score('電車が遅れてイライラした')
+
+    assert happy.happiness > 6 and happy.anger == 0
+    assert angry.anger > 3 and angry.happiness < 5
+    assert min(happy.confidence, angry.confidence) >= app_module.LOCAL_SCORER_MIN_CONFIDENCE
+
+
+def test_negation_reverses_the_term(scorer):
+    assert scorer.score('楽しくなかった').happiness < 5 < scorer.score('楽しかった').happiness
+
+
+def test_unclear_text_has_low_confidence(scorer):
+    assert scorer.score('今日は会議があった') == (5.0, 0.0, 0.0)
+    # 喜びと怒りが混在する場合は確信度を大きく下げる
+    assert scorer.score('楽しかったけどイライラした').confidence < app_module.LOCAL_SCORER_MIN_CONFIDENCE
+
+
+def test_score_many_matches_score(scorer):
+    texts = ['嬉しい', '最悪', '']
+    assert scorer.score_many(texts) == [scorer.score(text) for text in texts]
+
+
+def test_scorers_are_created_by_name():
+    assert isinstance(create_scorer('lexicon'), LexiconScorer)
+    with pytest.raises(ValueError):
+        create_scorer('unknown')
+    with pytest.raises(TypeError):
+        EmotionScorer()
+
+
+def test_prefilter_sends_only_unclear_posts_to_gemini(app, gemini, client, monkeypatch):
+    monkeypatch.setattr(app_module, 'SCORER_MODE', 'prefilter')
+
+    clear = client.post('/analyze_emotion', data={'text_content': '最高に嬉しい'}).get_json()
+    unclear = client.post('/analyze_emotion', data={'text_content': '今日は会議があった'}).get_json()
+
+    assert clear['scorer'] == 'local'
+    assert unclear['scorer'] == 'gemini'
+    assert gemini.calls == ['analysis']
+
+
+def test_prefilter_keeps_clear_texts_out_of_batches(app, gemini, monkeypatch):
+    monkeypatch.setattr(app_module, 'SCORER_MODE', 'prefilter')
+
+    scores, failed = app_module.score_texts([('1', '最高に嬉しい'), ('2', '今日は会議があった')])
+
+    assert set(scores) == {'1', '2'}
+    assert failed == []
+    assert gemini.calls == ['batch_analysis']
+
+
+def test_gemini_failure_falls_back_to_local_score(app, gemini, client, monkeypatch):
+    monkeypatch.setattr(app_module, 'LOCAL_SCORER_FALLBACK', True)
+    gemini.errors.append(RuntimeError('model down'))
+
+    body = client.post('/analyze_emotion', data={'text_content': '楽しかった'}).get_json()
+
+    assert body['scorer'] == 'local_fallback'
+    assert body['happiness'] == app_module.local_scorer.score('楽しかった').happiness
@@ -0,0 +1,89 @@
+import time
+from types import SimpleNamespace
+
+import pytest
+from google.genai import errors
+
+from model_gateway import CircuitBreaker, ModelGateway, ModelUnavailable
+
+
+class ScriptedModels:
+    """用意した例外・応答テキストを呼び出しごとに順に返す client.models"""
+
+    def __init__(self, outcomes):
+        self.outcomes = list(outcomes)
+        self.calls = 0
+
+    def generate_content(self, model, contents, config):
+        self.calls += 1
+        outcome = self.outcomes.pop(0)
+        if isinstance(outcome, Exception):
+            raise outcome
+        return SimpleNamespace(text=outcome, usage_metadata=None)
+
+
+def make_gateway(outcomes, **options):
+    models = ScriptedModels(outcomes)
+    client = SimpleNamespace(models=models)
+    options.setdefault('retry_base_seconds', 0.0)
+    return ModelGateway(lambda: client, 'test-model', **options), models
+
+
+def server_error():
+    return errors.ServerError(503, {'error': {'message': 'unavailable'}})
+
+
+def test_retryable_errors_are_retried():
+    gateway, models = make_gateway([server_error(), '{"happiness": 1, "anger": 2}'], max_retries=2)
+
+    response = gateway.generate('analysis', text_content='a')
+
+    assert response.text == '{"happiness": 1, "anger": 2}'
+    assert models.calls == 2
+    assert gateway.stats()['prompts']['analysis']['retries'] == 1
+
+
+def test_client_errors_are_not_retried_and_keep_breaker_closed():
+    gateway, models = make_gateway([errors.ClientError(400, {'error': {'message': 'bad'}})],
+                                   max_retries=2, breaker_threshold=1)
+
+    with pytest.raises(errors.ClientError):
+        gateway.generate('analysis', text_content='a')
+
+    assert models.calls == 1
+    assert gateway.breaker.state == 'closed'
+
+
+def test_breaker_opens_after_failures_and_recovers_after_reset():
+    gateway, models = make_gateway([server_error(), server_error(), '{}'],
+                                   max_retries=0, breaker_threshold=2, breaker_reset_seconds=0.05)
+
+    for _ in range(2):
+        with pytest.raises(errors.ServerError):
+            gateway.generate('analysis', text_content='a')
+    assert gateway.breaker.state == 'open'
+
+    # 開いている間はAPIを呼ばずに失敗する
+    with pytest.raises(ModelUnavailable):
+        gateway.generate('analysis', text_content='a')
+    assert models.calls == 2
+
+    time.sleep(0.06)
+    assert gateway.breaker.state == 'half_open'
+    gateway.generate('analysis', text_content='a')
+    assert gateway.breaker.state == 'closed'
+
+
+def test_half_open_allows_a_single_trial():
+    breaker = CircuitBreaker(failure_threshold=1, reset_seconds=0.0)
+    breaker.record_failure()
+
+    assert breaker.allow()
+    assert not breaker.allow()
+
+    # 試行が失敗すると再び開く
+    breaker.record_failure()
+    assert breaker.state in ('open', 'half_open')
+    assert breaker.allow()
+    breaker.record_success()
+    assert breaker.state == 'closed'
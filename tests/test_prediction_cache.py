@@ -0,0 +1,99 @@
+import datetime
+import threading
+
+import pytest
+
+import app as app_module
+from app import EmotionRecord, PredictionCache, db
+
+
+def add_record(app, days_ago=0):
+    with app.app_context():
+        record = EmotionRecord(text_content='a', happiness=6.0, anger=2.0,
+                               created_at=datetime.datetime.now() - datetime.timedelta(days=days_ago))
+        db.session.add(record)
+        app_module.add_record_to_rollups(record)
+        db.session.commit()
+
+
+@pytest.fixture
+def records(app):
+    for days_ago in range(3):
+        add_record(app, days_ago)
+
+
+def predict(client):
+    response = client.get('/predict_emotion')
+    assert response.status_code == 200
+    return response
+
+
+def test_cached_until_a_record_is_added(app, gemini, client, records):
+    first = predict(client)
+    second = predict(client)
+
+    assert first.headers['X-Prediction-Cache'] == 'miss'
+    assert second.headers['X-Prediction-Cache'] == 'hit'
+    assert int(second.headers['Age']) >= 0
+    assert second.get_json() == first.get_json()
+    assert gemini.calls == ['prediction_advice']
+
+    add_record(app)
+
+    assert predict(client).headers['X-Prediction-Cache'] == 'miss'
+    assert gemini.calls == ['prediction_advice'] * 2
+    with app.app_context():
+        # キーが変わった古い結果は削除される
+        assert PredictionCache.query.count() == 1
+
+
+def test_cache_survives_a_restart(app, gemini, client, records, monkeypatch):
+    predict(client)
+    # 再起動でプロセス内のキャッシュが消えても、DBに保存した結果を使う
+    monkeypatch.setattr(app_module, '_prediction_memory_cache', None)
+
+    response = predict(client)
+
+    assert response.headers['X-Prediction-Cache'] == 'hit'
+    assert gemini.calls == ['prediction_advice']
+
+
+def test_concurrent_requests_share_one_computation(app, gemini, records, monkeypatch):
+    started, release, waiting = threading.Event(), threading.Event(), threading.Event()
+    generate_content_stream = gemini.generate_content_stream
+
+    def slow_stream(*args, **kwargs):
+        started.set()
+        release.wait(5)
+        yield from generate_content_stream(*args, **kwargs)
+
+    wait_for_prediction = app_module.wait_for_prediction
+
+    def waiting_for_prediction(*args):
+        waiting.set()
+        return wait_for_prediction(*args)
+
+    gemini.generate_content_stream = slow_stream
+    monkeypatch.setattr(app_module, 'wait_for_prediction', waiting_for_prediction)
+
+    responses = {}
+
+    def request(name):
+        responses[name] = app.test_client().get('/predict_emotion')
+
+    leader = threading.Thread(target=request, args=('leader',))
+    leader.start()
+    assert started.wait(5)
+    follower = threading.Thread(target=request, args=('follower',))
+    follower.start()
+    # 後のリクエストが計算中の結果を待ち始めてから、アドバイスの生成を終わらせる
+    assert waiting.wait(5)
+    release.set()
+    leader.join(5)
+    follower.join(5)
+
+    assert responses['leader'].headers['X-Prediction-Cache'] == 'miss'
+    assert responses['follower'].headers['X-Prediction-Cache'] == 'shared'
+    assert responses['follower'].get_json() == responses['leader'].get_json()
+    assert gemini.calls == ['prediction_advice']
+    assert app_module._prediction_inflight == {}
@@ -0,0 +1,66 @@
+import datetime
+
+import pytest
+
+import app as app_module
+from app import EmotionRecord, EmotionRollup, db
+
+
+@pytest.fixture
+def records(app):
+    """3週にまたがる記録を1件ずつ追加し、そのつど集計テーブルに加算する"""
+    start = datetime.datetime(2025, 1, 4, 9)
+    with app.app_context():
+        for i in range(40):
+            record = EmotionRecord(text_content=f't{i}', happiness=float(i % 11), anger=float(i * 3 % 7),
+                                   created_at=start + datetime.timedelta(hours=i * 13))
+            db.session.add(record)
+            app_module.add_record_to_rollups(record)
+        db.session.commit()
+
+
+def stats(client, bucket, **params):
+    response = client.get('/emotion_stats', query_string={'bucket': bucket, **params})
+    assert response.status_code == 200
+    return response.get_json()['stats']
+
+
+def without_percentiles(items):
+    for item in items:
+        for metric in ('happiness', 'anger'):
+            item[metric] = {key: value for key, value in item[metric].items() if not key.startswith('p')}
+    return items
+
+
+@pytest.mark.parametrize('bucket', app_module.STATS_BUCKETS)
+def test_rollup_stats_match_raw_aggregates(app, client, records, bucket):
+    # percentiles を空にすると集計テーブルから、指定すると記録から集計する
+    rollup = stats(client, bucket, percentiles='')
+    raw = without_percentiles(stats(client, bucket, percentiles='50'))
+
+    assert rollup == raw
+    assert sum(item['count'] for item in rollup) == 40
+
+
+def test_rollup_stats_filter_by_bucket(app, client, records):
+    params = {'from': '2025-01-06', 'to': '2025-01-10'}
+
+    rollup = stats(client, 'day', percentiles='', **params)
+
+    assert [item['bucket_start'] for item in rollup] == [
+        f'2025-01-{day:02d} 00:00:00' for day in range(6, 10)
+    ]
+    assert rollup == without_percentiles(stats(client, 'day', percentiles='50', **params))
+
+
+def test_rebuild_rollups_command_recreates_the_table(app, client, records):
+    before = stats(client, 'hour', percentiles='')
+    with app.app_context():
+        EmotionRollup.query.delete()
+        db.session.commit()
+    assert stats(client, 'hour', percentiles='') == []
+
+    result = app.test_cli_runner().invoke(args=['rebuild-rollups'])
+
+    assert result.exit_code == 0
+    assert stats(client, 'hour', percentiles='') == before
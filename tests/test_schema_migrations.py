@@ -0,0 +1,56 @@
+from sqlalchemy import inspect, text
+
+import app as app_module
+from app import AnalysisJob, AppMetadata, TwitterOutbox, db
+
+
+def analysis_job_columns():
+    return {column['name'] for column in inspect(db.engine).get_columns('analysis_job')}
+
+
+def test_upgrade_from_plaintext_token_schema(app):
+    with app.app_context():
+        # 移行 4 まで適用済みのDB (analysis_job に kind / payload 列が無く、トークンは平文) を再現する
+        db.session.execute(text('ALTER TABLE analysis_job DROP COLUMN kind'))
+        db.session.execute(text('ALTER TABLE analysis_job DROP COLUMN payload'))
+        db.session.execute(text(
+            "INSERT INTO analysis_job (id, status, text_content, bypass_cache, post_to_twitter,"
+            " twitter_access_token, twitter_access_token_secret, created_at) VALUES"
+            " ('pending', 'pending', 'a', 0, 1, '42-access', 'access-secret', '2025-01-01 00:00:00'),"
+            " ('done', 'done', 'b', 0, 1, '42-access', 'access-secret', '2025-01-01 00:00:00')"
+        ))
+        db.session.add(TwitterOutbox(record_id=1, message='m', access_token='42-access',
+                                     access_token_secret='access-secret'))
+        db.session.merge(AppMetadata(key='schema_version', value='4'))
+        db.session.commit()
+        assert 'kind' not in analysis_job_columns()
+
+        assert app_module.migrate_database() == 2
+
+        assert {'kind', 'payload'} <= analysis_job_columns()
+        assert app_module.get_schema_version() == app_module.SCHEMA_MIGRATIONS[-1][0]
+        db.session.expire_all()
+        pending = db.session.get(AnalysisJob, 'pending')
+        assert pending.twitter_access_token != '42-access'
+        assert app_module.decrypt_twitter_tokens(
+            pending.twitter_access_token, pending.twitter_access_token_secret) == ('42-access', 'access-secret')
+        done = db.session.get(AnalysisJob, 'done')
+        assert done.twitter_access_token is None and done.twitter_access_token_secret is None
+        outbox = TwitterOutbox.query.one()
+        assert app_module.decrypt_twitter_tokens(outbox.access_token, outbox.access_token_secret) == (
+            '42-access', 'access-secret')
+
+        # 適用済みの移行は再実行しない
+        assert app_module.migrate_database() == 0
+
+
+def test_token_encryption_is_idempotent(app):
+    with app.app_context():
+        tokens = app_module.encrypt_twitter_tokens(('42-access', 'access-secret'))
+        db.session.add(TwitterOutbox(record_id=1, message='m', access_token=tokens[0], access_token_secret=tokens[1]))
+        db.session.commit()
+
+        app_module.encrypt_stored_twitter_tokens()
+
+        outbox = TwitterOutbox.query.one()
+        assert (outbox.access_token, outbox.access_token_secret) == tokens
@@ -0,0 +1,74 @@
+import datetime
+
+import pytest
+from sqlalchemy import text
+
+import app as app_module
+from app import AppMetadata, EmotionRecord, db
+
+
+@pytest.fixture
+def records(app):
+    with app.app_context():
+        db.session.add_all([
+            EmotionRecord(id=1, text_content='友達と映画を見て楽しかった', happiness=8.0, anger=0.0,
+                          created_at=datetime.datetime(2025, 1, 1)),
+            EmotionRecord(id=2, text_content='電車が遅れてイライラした', happiness=3.0, anger=7.0,
+                          created_at=datetime.datetime(2025, 1, 2)),
+            EmotionRecord(id=3, text_content='映画館のポップコーン', happiness=6.0, anger=0.0,
+                          created_at=datetime.datetime(2025, 1, 3)),
+        ])
+        db.session.commit()
+
+
+def search_ids(client, **params):
+    response = client.get('/search', query_string=params)
+    assert response.status_code == 200
+    return [item['id'] for item in response.get_json()['results']]
+
+
+def test_full_text_and_short_terms(app, client, records):
+    with app.app_context():
+        assert app_module.search_fts_available()
+
+    assert search_ids(client, q='楽しかった') == [1]
+    # 3文字未満の語は部分一致で絞り込む
+    assert sorted(search_ids(client, q='映画')) == [1, 3]
+    assert search_ids(client, q='映画 楽しかった') == [1]
+    assert search_ids(client, q='映画', anger_max=0, sort='newest') == [3, 1]
+
+
+def test_triggers_keep_the_index_in_sync(app, client, records):
+    with app.app_context():
+        db.session.get(EmotionRecord, 2).text_content = '電車が遅れて残念だった'
+        db.session.delete(db.session.get(EmotionRecord, 1))
+        db.session.commit()
+
+    assert search_ids(client, q='イライラ') == []
+    assert search_ids(client, q='残念だった') == [2]
+    assert search_ids(client, q='楽しかった') == []
+
+
+def test_failed_index_build_falls_back_to_like(app, client, records):
+    with app.app_context():
+        # FTS5 ではない同名のテーブルがあり、索引の再構築が失敗するDB
+        app_module.drop_search_index()
+        db.session.execute(text(f'CREATE TABLE {app_module.SEARCH_FTS_TABLE} (id INTEGER)'))
+        db.session.merge(AppMetadata(key='schema_version', value='3'))
+        db.session.commit()
+
+        app_module.migrate_database()
+
+        assert app_module.get_schema_version() == app_module.SCHEMA_MIGRATIONS[-1][0]
+        assert not app_module.search_fts_available()
+        # 同期用のトリガーが残っていないため、記録を追加できる
+        db.session.add(EmotionRecord(id=4, text_content='楽しかった一日', happiness=7.0, anger=0.0))
+        db.session.commit()
+
+    assert sorted(search_ids(client, q='楽しかった')) == [1, 4]
+
+    with app.app_context():
+        # rebuild-search-index と同じく作り直すと全文検索に戻る
+        app_module.create_search_index()
+        assert app_module.search_fts_available()
+    assert sorted(search_ids(client, q='楽しかった')) == [1, 4]
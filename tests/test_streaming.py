@@ -0,0 +1,119 @@
+import datetime
+import io
+import json
+import os
+
+from PIL import Image
+
+import app as app_module
+from app import EmotionRecord, EmotionRollup, TwitterQuota, db
+
+
+def png_file():
+    buffer = io.BytesIO()
+    Image.new('RGB', (8, 8), (0, 128, 255)).save(buffer, 'PNG')
+    buffer.seek(0)
+    return buffer, 'photo.png'
+
+
+def iter_events(response):
+    """SSEのレスポンスを (イベント名, データ) として1件ずつ読む"""
+    for chunk in response.response:
+        chunk = chunk.decode('utf-8') if isinstance(chunk, bytes) else chunk
+        for block in chunk.strip().split('\n\n'):
+            event, data = (line.split(': ', 1)[1] for line in block.split('\n'))
+            yield event, json.loads(data)
+
+
+def uploaded_files():
+    folder = app_module.app.config['UPLOAD_FOLDER']
+    return [name for name in os.listdir(folder) if os.path.isfile(os.path.join(folder, name))]
+
+
+def remaining_uses():
+    quota = db.session.get(TwitterQuota, '42')
+    return quota.remaining_uses if quota else app_module.TWITTER_DAILY_LIMIT
+
+
+def test_analysis_stream_reports_each_stage(app, gemini, linked_client):
+    response = linked_client.post('/analyze_emotion', data={
+        'text_content': '楽しかった', 'stream': 'true', 'post_to_twitter': 'true',
+    })
+
+    events = list(iter_events(response))
+
+    stages = [data['stage'] for event, data in events if event == 'stage']
+    assert stages == ['saved', 'scoring', 'scored', 'stored', 'tweet_queued']
+    event, result = events[-1]
+    assert event == 'result'
+    assert result['happiness'] == 7.0
+    assert result['twitter_status'] == 'pending'
+
+
+def test_disconnect_before_commit_rolls_back(app, gemini, linked_client):
+    before = set(uploaded_files())
+    response = linked_client.post('/analyze_emotion', data={
+        'text_content': '楽しかった', 'stream': 'true', 'post_to_twitter': 'true', 'file': png_file(),
+    })
+    with app.app_context():
+        assert remaining_uses() == app_module.TWITTER_DAILY_LIMIT - 1
+
+    # scoring の段階でクライアントが切断した
+    for event, data in iter_events(response):
+        if data.get('stage') == 'scoring':
+            break
+    response.close()
+
+    with app.app_context():
+        assert remaining_uses() == app_module.TWITTER_DAILY_LIMIT
+        assert EmotionRecord.query.count() == 0
+    assert set(uploaded_files()) == before
+
+
+def test_analysis_error_is_sent_as_event(app, gemini, linked_client):
+    gemini.errors.append(RuntimeError('model down'))
+    response = linked_client.post('/analyze_emotion', data={
+        'text_content': '楽しかった', 'stream': 'true', 'post_to_twitter': 'true',
+    })
+
+    event, data = list(iter_events(response))[-1]
+
+    assert event == 'error'
+    with app.app_context():
+        assert remaining_uses() == app_module.TWITTER_DAILY_LIMIT
+
+
+def test_failure_after_commit_keeps_the_record(app, gemini, monkeypatch):
+    refunds = []
+
+    def failing_refund(account):
+        refunds.append(account)
+        raise RuntimeError('db down')
+
+    monkeypatch.setattr(app_module, 'refund_twitter_quota', failing_refund)
+    with app.app_context():
+        # トークンを復号できなかったジョブと同じく、投稿回数を予約済みだが投稿しない場合
+        result = app_module.process_analysis('a', None, None, False, True, None, '42', 2)
+
+        assert result['status'] == 'success'
+        assert EmotionRecord.query.count() == 1
+    assert refunds == ['42']
+
+
+def test_prediction_stream_sends_forecast_then_advice(app, gemini, client):
+    with app.app_context():
+        for days_ago in range(3):
+            record = EmotionRecord(text_content='a', happiness=6.0, anger=2.0,
+                                   created_at=datetime.datetime.now() - datetime.timedelta(days=days_ago))
+            db.session.add(record)
+            app_module.add_record_to_rollups(record)
+        db.session.commit()
+        assert EmotionRollup.query.filter_by(granularity='day').count() == 3
+
+    events = list(iter_events(client.get('/predict_emotion?stream=true')))
+
+    names = [event for event, _ in events]
+    assert names[0] == 'forecast'
+    assert 'advice' in names
+    assert names[-1] == 'done'
+    assert events[-1][1]['prediction']['advice'] == ['ゆっくり休みましょう。']
@@ -0,0 +1,120 @@
+import datetime
+import json
+
+import pytest
+import requests
+from tweepy.errors import TwitterServerError, Unauthorized
+
+import app as app_module
+from app import EmotionRecord, TwitterOutbox, TwitterQuota, db
+
+
+def twitter_response(status_code, body=None, headers=None):
+    response = requests.models.Response()
+    response.status_code = status_code
+    response.reason = 'test'
+    response.headers.update(headers or {})
+    response._content = json.dumps(body or {}).encode('utf-8')
+    return response
+
+
+class FakeTwitterV2:
+    def __init__(self):
+        self.errors = []
+        self.tweets = []
+
+    def create_tweet(self, text, media_ids=None):
+        if self.errors:
+            raise self.errors.pop(0)
+        self.tweets.append(text)
+        return twitter_response(201, {'data': {'id': '1001'}}, {'x-rate-limit-remaining': '10'})
+
+
+@pytest.fixture
+def twitter(monkeypatch):
+    v2 = FakeTwitterV2()
+    monkeypatch.setattr(app_module, 'get_twitter_clients', lambda access_token, access_token_secret: (None, v2))
+    return v2
+
+
+@pytest.fixture
+def queued_tweet(app):
+    """投稿回数を1回予約済みの投稿キューの1件"""
+    with app.app_context():
+        app_module.reserve_twitter_quota('42', datetime.datetime.now())
+        record = EmotionRecord(text_content='楽しかった', happiness=8.0, anger=1.0)
+        db.session.add(record)
+        db.session.flush()
+        outbox = app_module.enqueue_tweet(record, '42', ('42-access', 'access-secret'))
+        db.session.commit()
+        return outbox.id
+
+
+def load(outbox_id):
+    return db.session.get(TwitterOutbox, outbox_id)
+
+
+def test_tweet_is_posted_and_tokens_cleared(app, twitter, queued_tweet):
+    with app.app_context():
+        assert app_module.process_twitter_outbox() == 1
+        outbox = load(queued_tweet)
+        assert outbox.status == 'posted'
+        assert outbox.tweet_id == '1001'
+        assert outbox.access_token is None and outbox.access_token_secret is None
+    assert len(twitter.tweets) == 1
+
+
+def test_server_error_is_retried_with_backoff(app, twitter, queued_tweet):
+    twitter.errors.append(TwitterServerError(twitter_response(503)))
+    with app.app_context():
+        now = datetime.datetime.now()
+        app_module.process_twitter_outbox(now)
+        outbox = load(queued_tweet)
+        assert outbox.status == 'pending'
+        assert outbox.attempts == 1
+        assert outbox.next_attempt_at > now
+        assert outbox.access_token is not None
+
+        # 再試行の時刻までは送らない
+        assert app_module.process_twitter_outbox(now) == 0
+        app_module.process_twitter_outbox(outbox.next_attempt_at)
+        assert load(queued_tweet).status == 'posted'
+
+
+def test_failed_tweet_refunds_quota(app, twitter, queued_tweet):
+    twitter.errors.append(Unauthorized(twitter_response(401)))
+    with app.app_context():
+        assert db.session.get(TwitterQuota, '42').remaining_uses == app_module.TWITTER_DAILY_LIMIT - 1
+
+        app_module.process_twitter_outbox()
+
+        outbox = load(queued_tweet)
+        assert outbox.status == 'failed'
+        assert outbox.attempts == 1
+        assert outbox.access_token is None and outbox.access_token_secret is None
+        assert db.session.get(TwitterQuota, '42').remaining_uses == app_module.TWITTER_DAILY_LIMIT
+
+
+def test_retries_stop_after_max_attempts(app, twitter, queued_tweet):
+    twitter.errors.extend(TwitterServerError(twitter_response(503)) for _ in range(app_module.TWITTER_MAX_ATTEMPTS))
+    with app.app_context():
+        for _ in range(app_module.TWITTER_MAX_ATTEMPTS):
+            outbox = load(queued_tweet)
+            app_module.process_twitter_outbox(outbox.next_attempt_at)
+
+        outbox = load(queued_tweet)
+        assert outbox.status == 'failed'
+        assert outbox.attempts == app_module.TWITTER_MAX_ATTEMPTS
+        assert db.session.get(TwitterQuota, '42').remaining_uses == app_module.TWITTER_DAILY_LIMIT
+
+
+def test_undecryptable_tokens_fail_and_refund(app, twitter, queued_tweet, monkeypatch):
+    monkeypatch.setitem(app.config, 'SECRET_KEY', 'another-secret-key')
+    with app.app_context():
+        app_module.process_twitter_outbox()
+
+        outbox = load(queued_tweet)
+        assert outbox.status == 'failed'
+        assert outbox.access_token is None
+        assert db.session.get(TwitterQuota, '42').remaining_uses == app_module.TWITTER_DAILY_LIMIT
+    assert twitter.tweets == []
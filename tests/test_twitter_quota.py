@@ -0,0 +1,59 @@
+import datetime
+import threading
+
+import app as app_module
+from app import TwitterQuota, db
+
+
+def test_concurrent_reservations_never_exceed_limit(app):
+    limit = app_module.TWITTER_DAILY_LIMIT
+    now = datetime.datetime.now()
+    start = threading.Barrier(limit * 4)
+    results = []
+
+    def reserve():
+        with app.app_context():
+            start.wait()
+            results.append(app_module.reserve_twitter_quota('42', now))
+
+    threads = [threading.Thread(target=reserve) for _ in range(limit * 4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    granted = sorted(remaining for remaining in results if remaining is not None)
+    assert granted == list(range(limit))
+    with app.app_context():
+        assert db.session.get(TwitterQuota, '42').remaining_uses == 0
+
+
+def test_refund_does_not_exceed_limit(app):
+    with app.app_context():
+        remaining = app_module.reserve_twitter_quota('42', datetime.datetime.now())
+        assert remaining == app_module.TWITTER_DAILY_LIMIT - 1
+
+        assert app_module.refund_twitter_quota('42') == app_module.TWITTER_DAILY_LIMIT
+        assert app_module.refund_twitter_quota('42') == app_module.TWITTER_DAILY_LIMIT
+
+
+def test_quota_resets_after_window(app):
+    now = datetime.datetime.now()
+    with app.app_context():
+        db.session.add(TwitterQuota(account='42', remaining_uses=0, last_used_at=now))
+        db.session.commit()
+        assert app_module.reserve_twitter_quota('42', now) is None
+
+        later = now + datetime.timedelta(hours=app_module.QUOTA_WINDOW_HOURS)
+        assert app_module.reserve_twitter_quota('42', later) == app_module.TWITTER_DAILY_LIMIT - 1
+
+
+def test_exhausted_quota_returns_429_without_calling_gemini(app, gemini, linked_client):
+    with app.app_context():
+        db.session.add(TwitterQuota(account='42', remaining_uses=0, last_used_at=datetime.datetime.now()))
+        db.session.commit()
+
+    response = linked_client.post('/analyze_emotion', data={'text_content': 'a', 'post_to_twitter': 'true'})
+
+    assert response.status_code == 429
+    assert gemini.calls == []
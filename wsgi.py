@@ -0,0 +1,9 @@
+"""
+WSGIサーバーのエントリポイント
+
+    gunicorn -c gunicorn.conf.py wsgi:app                          (Linux / macOS)
+    waitress-serve --listen=127.0.0.1:5000 --threads=8 wsgi:app   (Windows)
+"""
+from app import create_app
+
+app = create_app()
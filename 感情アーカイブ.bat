@@ -6,6 +6,7 @@ rem
 call venv\Scripts\activate
 
 rem 
-python app.py
+start "" /b cmd /c "timeout /t 2 /nobreak >nul & start http://127.0.0.1:5000"
+waitress-serve --listen=127.0.0.1:5000 --threads=8 wsgi:app
 
 pause
\ No newline at end of file